@@ -4,6 +4,8 @@
 # Licence : MIT
 """Client interface calls several sub-system of Kami-lib
 """
+import os
+from itertools import chain, combinations, zip_longest
 from typing import Union
 
 from kami.parser import (parser_text,
@@ -13,14 +15,36 @@ from kami.preprocessing.transformation import (RemoveDigits,
                                                ToUpperCase,
                                                RemovePunctuation,
                                                RemoveDiacritics,
-                                               _Composer,
                                                count_diacritics)
 from kami.transcription.prediction import _KrakenPrediction
-from kami.metrics.evaluation import Scorer
+from kami.metrics.evaluation import (Scorer,
+                                     _iter_scored,
+                                     _score_corpus)
+from kami.metrics.pairing import (match_lines as _match_lines,
+                                  pair_lines as _pair_lines)
 
 import warnings
 warnings.filterwarnings("ignore")
 
+# A dictionary associate the user code / the preprocessing function / readable name of function
+# Codes legend for users :  D : digits / U : uppercase / L : lowercase / P : punctuation / X : diacritics
+_CODES_TRANSFORMS = {
+    "D": (RemoveDigits(), "non_digits"),
+    "U": (ToUpperCase(), "uppercase"),
+    "L": (ToLowerCase(), "lowercase"),
+    "P": (RemovePunctuation(), "remove_punctuation"),
+    "X": (RemoveDiacritics(), "remove_diacritics")
+}
+
+# Total length of transformed texts (or of streamed sources) beyond which they are scored in a pool of processes
+_PARALLEL_MIN_CHARS = 100000
+
+
+def _source_size(source: str) -> int:
+    """Size of a text source : bytes of a file or characters of a string."""
+    return os.path.getsize(source) if os.path.isfile(source) else len(source)
+
+
 class Kami:
     """A Facade class provides a simple interface to the complex logic of one or
     several subsystems in Kami.
@@ -62,6 +86,24 @@ class Kami:
         :type percent: bool
         :param round_digits: Set the number of digits after floating point in string form. Defaults to to '.01'.
         :type round_digits: str
+        :param max_cer: Triage bound on the character error rate (as a ratio, eg. 0.05), scores above it
+        are only reported as "above_threshold". Defaults to None.
+        :type max_cer: float
+        :param max_distance: Triage bound on the character edit distance, see `max_cer`. Defaults to None.
+        :type max_distance: int
+        :param streaming: Score two text files (or strings) line by line with constant memory, scores
+        are then micro-averaged over lines (`workers` score lines in parallel if sources are long). Defaults to False.
+        :type streaming: bool
+        :param pair_lines: Pair lines of ground truth and prediction before scoring (see :func: `pair_lines`),
+        so lines merged, split or dropped by the recognition do not lead to a huge alignment of whole texts ;
+        scores are then micro-averaged over pairs of lines. Defaults to False.
+        :type pair_lines: bool
+        :param unordered_lines: Match lines of ground truth and prediction whatever their order before scoring
+        (see :func: `match_lines`), for reading order errors eg. on multi-column pages. Defaults to False.
+        :type unordered_lines: bool
+        :param severity_matrix: Score every combination of the transformations of `apply_transforms`
+        (of all transformations if `apply_transforms` is empty), see `severity_scores`. Defaults to False.
+        :type severity_matrix: bool
 
     Attributes
     ----------
@@ -93,6 +135,21 @@ class Kami:
         :type percent: bool
         :ivar round_digits: see also `Parameters` section for more details.
         :type round_digits: str
+        :ivar max_cer: see also `Parameters` section for more details.
+        :type max_cer: float
+        :ivar max_distance: see also `Parameters` section for more details.
+        :type max_distance: int
+        :ivar streaming: see also `Parameters` section for more details.
+        :type streaming: bool
+        :ivar pair_lines: see also `Parameters` section for more details.
+        :type pair_lines: bool
+        :ivar unordered_lines: see also `Parameters` section for more details.
+        :type unordered_lines: bool
+        :ivar severity_matrix: see also `Parameters` section for more details.
+        :type severity_matrix: bool
+        :ivar severity_scores: boards of each combination of transformations, by codes (eg. "DLX")
+        and "default" for texts without transformation ; None if `severity_matrix` is False.
+        :type severity_scores: dict
         :ivar reference_preprocess: ground truth with text preprocessing applied
         :type reference_preprocess: str
         :ivar prediction_preprocess: prediction with text preprocessing applied
@@ -116,7 +173,13 @@ class Kami:
                  deletion_cost: float = 1.0,
                  truncate: bool = False,
                  percent: bool = False,
-                 round_digits: str = '.01'
+                 round_digits: str = '.01',
+                 max_cer: float = None,
+                 max_distance: int = None,
+                 streaming: bool = False,
+                 pair_lines: bool = False,
+                 unordered_lines: bool = False,
+                 severity_matrix: bool = False
                  ) -> None:
 
         # Data inputs
@@ -145,12 +208,57 @@ class Kami:
         self.percent = percent
         self.round_digits = round_digits
 
+        # Triage options
+        self.max_cer = max_cer
+        self.max_distance = max_distance
+
+        # Streaming option
+        self.streaming = streaming
+
+        # Line pairing options
+        self.pair_lines = pair_lines
+        self.unordered_lines = unordered_lines
+
+        # Severity matrix option
+        self.severity_matrix = severity_matrix
+
         # Output
         self.reference_preprocess = ""
         self.prediction_preprocess = ""
         self.scores = None
-
-        if isinstance(data, list) and len(data) > 1:
+        self.severity_scores = None
+
+        # Transformed texts memoised by sequence of codes
+        self._transformed = dict()
+
+        if streaming and (len(apply_transforms) > 0 or severity_matrix):
+            raise ValueError("Textual transformations (apply_transforms, severity_matrix) are not available "
+                             "in streaming mode.")
+
+        if streaming and (pair_lines or unordered_lines):
+            raise ValueError("Lines pairing (pair_lines, unordered_lines) is not available in streaming mode, "
+                             "lines are paired in order.")
+
+        if isinstance(data, list) and len(data) > 1 and streaming:
+            # case with two huge text files (or strings) => score line by line and accumulate corpus totals,
+            # only one line of each source is kept in memory
+            lines_pairs = zip_longest(parser_text._TextParser(data[0], lazy=True).lines(),
+                                      parser_text._TextParser(data[1], lazy=True).lines(),
+                                      fillvalue="")
+            parallel = sum(map(_source_size, data[:2])) >= _PARALLEL_MIN_CHARS
+            _, self.scores = _score_corpus(lines_pairs,
+                                           workers=self.workers if parallel else 1,
+                                           keep_boards=False,
+                                           insertion_cost=self.insertion_weigtht,
+                                           deletion_cost=self.deletion_weight,
+                                           substitution_cost=self.substitution_weigtht,
+                                           truncate_score=self.truncate,
+                                           show_percent=self.percent,
+                                           round_digits=self.round_digits,
+                                           max_cer=self.max_cer,
+                                           max_distance=self.max_distance)
+
+        elif isinstance(data, list) and len(data) > 1:
             # case with two text files => compute score
             if data[0].endswith('txt') and data[1].endswith('txt'):
                 self.reference = parser_text._TextParser(data[0]).text
@@ -160,14 +268,16 @@ class Kami:
                 self.reference = data[0]
                 self.prediction = data[1]
 
-            self.scores = Scorer(self.reference,
-                                 self.prediction,
-                                 insertion_cost=self.insertion_weigtht,
-                                 deletion_cost=self.deletion_weight,
-                                 substitution_cost=self.substitution_weigtht,
-                                 truncate_score=self.truncate,
-                                 show_percent=self.percent,
-                                 round_digits=self.round_digits)
+            self.scores = self._score(self.reference,
+                                      self.prediction,
+                                      insertion_cost=self.insertion_weigtht,
+                                      deletion_cost=self.deletion_weight,
+                                      substitution_cost=self.substitution_weigtht,
+                                      truncate_score=self.truncate,
+                                      show_percent=self.percent,
+                                      round_digits=self.round_digits,
+                                      max_cer=self.max_cer,
+                                      max_distance=self.max_distance)
 
         # case with GT XML PAGE / XML ALTO => create a HTR pipeline => compute scores
         elif isinstance(data, str) and data.endswith('xml'):
@@ -183,49 +293,52 @@ class Kami:
                                          seg_bounds=bounds,
                                          verbosity=self.verbosity)
             self.prediction = pipeline.pred_content
-            self.scores = Scorer(self.reference,
-                                 self.prediction,
-                                 insertion_cost=self.insertion_weigtht,
-                                 deletion_cost=self.deletion_weight,
-                                 substitution_cost=self.substitution_weigtht,
-                                 truncate_score=self.truncate,
-                                 show_percent=self.percent,
-                                 round_digits=self.round_digits)
+            self.scores = self._score(self.reference,
+                                      self.prediction,
+                                      insertion_cost=self.insertion_weigtht,
+                                      deletion_cost=self.deletion_weight,
+                                      substitution_cost=self.substitution_weigtht,
+                                      truncate_score=self.truncate,
+                                      show_percent=self.percent,
+                                      round_digits=self.round_digits,
+                                      max_cer=self.max_cer,
+                                      max_distance=self.max_distance)
 
 
         else:
             raise ValueError("Something is wrong. Check your data (ground truth and/or prediction).")
 
+        # Diacritics of raw texts are counted in the pass that removes them (texts memoised for variants)
+        if "X" in apply_transforms:
+            removed = [_CODES_TRANSFORMS["X"][0].process_and_count(text) for text in (self.reference, self.prediction)]
+            self._transformed[("X",)] = tuple(text for text, _ in removed)
+            diacritics_reference, diacritics_prediction = (count for _, count in removed)
+
+        # Case with severity matrix (before the board is modulated by preprocessing)
+        if severity_matrix:
+            self.severity_scores = self._compute_severity_matrix(
+                [code for code in _CODES_TRANSFORMS if code in apply_transforms] or list(_CODES_TRANSFORMS))
+
         # Case with preprocessing and modulate .board dict of Scorer object
         if len(apply_transforms) > 0:
             # Create a new dict to save the different state of computations during the transformations
             new_score = dict()
 
-            # Create a new list to save the functions of transformations
-            to_compose = list()
-
-            # A dictionary associate the user code / the preprocessing function / readable name of function
-            # Codes legend for users :  D : digits / U : uppercase / L : lowercase / P : punctuation / X : diacritics
-            CODES_TRANSFORMS = {
-                "D": (RemoveDigits(), "non_digits"),
-                "U": (ToUpperCase(), "uppercase"),
-                "L": (ToLowerCase(), "lowercase"),
-                "P": (RemovePunctuation(), "remove_punctuation"),
-                "X": (RemoveDiacritics(), "remove_diacritics")
-            }
+            codes = [code for code in _CODES_TRANSFORMS if code in apply_transforms]
 
             # Initialize the default dict that corresponding to computations on sequences before the applications of
             # transformations
             new_score["default"] = self.scores.board
 
-            for code in CODES_TRANSFORMS.items():
-                if code[0] in apply_transforms:
-                    to_compose.append(code[1][0])
-                    # Retrieve the scores of one transformation and add this in new dict with readable name
-                    new_score[code[1][1]] = self._compute_state_transformations(code[1][0]).board
-            # Retrieve the scores of all transformations in same time and add this in new dict with readable name
-            scores_all_transforms, sequences_all_transforms = self._compute_all_transformations(to_compose)
-            new_score["all_transforms"] = scores_all_transforms.board
+            variants = [(_CODES_TRANSFORMS[code][1], self._transform_texts((code,))) for code in codes]
+            sequences_all_transforms = self._transform_texts(tuple(codes))
+            variants.append(("all_transforms", sequences_all_transforms))
+
+            # Retrieve the scores of each transformation and of all transformations in same time
+            # and add this in new dict with readable name
+            boards = self._score_variants([texts for _, texts in variants])
+            for (name, _), board in zip(variants, boards):
+                new_score[name] = board
 
 
             # Count total char transformed with
@@ -253,11 +366,11 @@ class Kami:
                 # Compute the number of diacritics removed
                 total_diacritics_reference \
                     = (
-                        count_diacritics(self.reference)
+                        diacritics_reference
                         - count_diacritics(self.reference_preprocess))
                 total_diacritics_prediction \
                     = (
-                        count_diacritics(self.prediction)
+                        diacritics_prediction
                         - count_diacritics(self.prediction_preprocess))
                 new_score["Total_diacritics_removed_from_reference"] = total_diacritics_reference
                 new_score["Total_diacritics_removed_from_prediction"] = total_diacritics_prediction
@@ -290,36 +403,60 @@ class Kami:
             # Add all scores to a final board
             self.scores.board = new_score
 
-    def _compute_state_transformations(self, type_transform):
-        """Compute scores for one transformation
+    def _score(self, reference, prediction, **options):
+        """Score two texts, pair by pair of lines if lines are paired or matched
+        """
+        if not (self.pair_lines or self.unordered_lines):
+            return Scorer(reference, prediction, **options)
+        pairing = _match_lines if self.unordered_lines else _pair_lines
+        lines_pairs = pairing([line for line in reference.split('\n') if line.strip() != ''],
+                              [line for line in prediction.split('\n') if line.strip() != ''])
+        _, scores = _score_corpus(lines_pairs, keep_boards=False, **options)
+        return scores
+
+    def _transform_texts(self, codes):
+        """Return reference and prediction transformed by a sequence of codes. Texts are memoised,
+        so texts of a sequence extend those of its prefix (eg. "DLX" from "DL") instead of
+        starting again from raw texts.
         """
-        transform = type_transform(
-            [self.reference, self.prediction]
-        )
-        scores_transform = Scorer(
-            transform[0],
-            transform[1],
-            truncate_score=self.truncate,
-            show_percent=self.percent,
-            round_digits=self.round_digits
-        )
-
-        return scores_transform
-
-    def _compute_all_transformations(self, types_transforms):
-        """Compute scores for all transformations
+        if not codes:
+            return self.reference, self.prediction
+        if codes not in self._transformed:
+            self._transformed[codes] = tuple(_CODES_TRANSFORMS[codes[-1]][0](list(self._transform_texts(codes[:-1]))))
+        return self._transformed[codes]
+
+    def _compute_severity_matrix(self, codes):
+        """Compute boards of every combination of transformations, along the prefix DAG of their sequences
+        of codes, unique transformed texts scored once
         """
-        transform_for_all = _Composer(types_transforms)(
-            [self.reference,
-             self.prediction]
-        )
-
-        scores_transform_all = Scorer(
-            transform_for_all[0],
-            transform_for_all[1],
-            truncate_score=self.truncate,
-            show_percent=self.percent,
-            round_digits=self.round_digits
-        )
-
-        return scores_transform_all, transform_for_all
+        subsets = [subset for size in range(len(codes) + 1) for subset in combinations(codes, size)]
+        boards = self._score_variants([self._transform_texts(subset) for subset in subsets])
+        return {"".join(subset) or "default": board for subset, board in zip(subsets, boards)}
+
+    def _score_variants(self, texts):
+        """Compute boards of several (reference, prediction) transformed texts, scored concurrently
+        in a pool of `workers` processes if texts are long, with the options (costs, display, triage) of
+        the default board. Texts scored once for identical variants and texts left unchanged by
+        transformations reuse the default board.
+        """
+        options = dict(insertion_cost=self.insertion_weigtht,
+                       deletion_cost=self.deletion_weight,
+                       substitution_cost=self.substitution_weigtht,
+                       truncate_score=self.truncate,
+                       show_percent=self.percent,
+                       round_digits=self.round_digits,
+                       max_cer=self.max_cer,
+                       max_distance=self.max_distance)
+        boards = {(self.reference, self.prediction): self.scores.board}
+        unique_texts = [pair for pair in dict.fromkeys(texts) if pair not in boards]
+
+        if self.pair_lines or self.unordered_lines:
+            scored = (self._score(reference, prediction, **options).board for reference, prediction in unique_texts)
+        else:
+            parallel = len(unique_texts) > 1 and sum(map(len, chain.from_iterable(unique_texts))) >= _PARALLEL_MIN_CHARS
+            scored = (board for board, _ in _iter_scored(unique_texts,
+                                                         min(self.workers, len(unique_texts)) if parallel else 1,
+                                                         1,
+                                                         options))
+        boards.update(zip(unique_texts, scored))
+        return [dict(boards[pair]) for pair in texts]
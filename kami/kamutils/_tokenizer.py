@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Authors : Lucas Terriel <lucas.terriel@inria.fr>
+# Licence : MIT
+"""Tokenization of texts into words with their offsets.
+"""
+
+import re
+from array import array
+from typing import List, Tuple
+
+__all__ = [
+    "_Tokenizer",
+]
+
+# Characters of a word : letters, digits, "_" and combining marks (eg. abbreviation
+# marks of medieval texts or decomposed accents), which `\w` alone does not match
+_WORD_CHARACTERS = "\\w\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f"
+
+# Tokens split on whitespace only, the same tokens as `str.split()`
+_WHITESPACE_TOKEN_PATTERN = re.compile(r"\S+")
+# Words and each punctuation sign as its own token, eg. "Curée," gives "Curée" and ","
+_PUNCTUATION_TOKEN_PATTERN = re.compile(f"[{_WORD_CHARACTERS}]+|\\S")
+
+
+class _Tokenizer:
+    """A compiled tokenizer of words (Unicode aware) that gives tokens or their spans in the text.
+
+    Spans are compact start and end offsets arrays in the original string, so tokens are located
+    (eg. to report errors by word) without copying substrings.
+
+    :Example:
+
+    >>> tokenizer = _Tokenizer(split_punctuation=True)
+    >>> tokenizer.tokens("la Curée, dit-il")
+    ['la', 'Curée', ',', 'dit', '-', 'il']
+    >>> tokenizer.spans("la Curée,")
+    (array('i', [0, 3, 8]), array('i', [2, 8, 9]))
+
+    Parameters
+    ----------
+        :param split_punctuation: `True` to split punctuation signs from words (each one is a token),
+        else tokens are split on whitespace only as `str.split()`. Defaults to False.
+        :type split_punctuation: bool
+
+    Attributes
+    ----------
+        :ivar split_punctuation: see also `Parameters` section for more details.
+        :type split_punctuation: bool
+    """
+
+    __slots__ = ("split_punctuation", "_pattern")
+
+    def __init__(self, split_punctuation: bool = False) -> None:
+        self.split_punctuation = split_punctuation
+        self._pattern = _PUNCTUATION_TOKEN_PATTERN if split_punctuation else _WHITESPACE_TOKEN_PATTERN
+
+    def tokens(self, text: str) -> List[str]:
+        """Return tokens of text."""
+        if not self.split_punctuation:
+            # same tokens as the pattern, `str.split()` is the fastest way to get them
+            return text.split()
+        return self._pattern.findall(text)
+
+    def spans(self, text: str) -> Tuple[array, array]:
+        """Return start and end offsets of tokens in text, as two arrays of integers
+        (int32, or int64 for texts beyond 2**31 characters)."""
+        typecode = "i" if len(text) < 2 ** 31 else "q"
+        starts, ends = array(typecode), array(typecode)
+        for match in self._pattern.finditer(text):
+            start, end = match.span()
+            starts.append(start)
+            ends.append(end)
+        return starts, ends
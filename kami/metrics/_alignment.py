@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+# Authors : Lucas Terriel <lucas.terriel@inria.fr>
+# Licence : MIT
+"""Alignment engines used by metrics.
+"""
+
+from collections import Counter
+from fractions import Fraction
+from math import gcd
+from operator import itemgetter
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+from Levenshtein import (distance,
+                         editops)
+
+__all__ = [
+    "_MAX_CELLS",
+    "_exceeds_distance",
+    "_last_row",
+    "_linear_editops",
+    "_weighted_distance",
+    "_weighted_editops"
+]
+
+# Largest sub-problem (len(a) * len(b)) aligned at once by editops, beyond it texts
+# are split so memory stays bounded for whole volumes. editops of python-Levenshtein
+# is already linear in memory for long texts and faster than splitting in Python,
+# so the bound is high.
+_MAX_CELLS = 1 << 40
+
+# Largest factor to turn decimal costs into the integer weights of the C extension
+_MAX_COSTS_SCALE = 10 ** 6
+
+# Largest sub-problem (len(a) * len(b)) aligned at once with weighted costs, its whole table
+# of costs is kept for the backtrace (8 bytes a cell), larger ones are split in two
+_MAX_WEIGHTED_CELLS = 1 << 22
+
+
+def _last_row(pattern: Sequence, text: Sequence) -> List[int]:
+    """Compute the last row of the Levenshtein table of `pattern` against every prefix of `text`.
+
+    Use the bit-parallel algorithm of Hyyrö (2003) on Python integers: a column of the table
+    is stored as bit-vectors of vertical deltas, so memory is linear in `len(pattern)`.
+
+    :Example:
+
+    >>> _last_row("chat", "chta")
+    [4, 3, 2, 1, 2]
+
+    :param pattern: sequence aligned in rows
+    :type pattern: str or list
+    :param text: sequence aligned in columns
+    :type text: str or list
+    :return: distances between `pattern` and `text[:j]` for j in 0..len(text)
+    :rtype: list
+    """
+    length = len(pattern)
+    if not length:
+        return list(range(len(text) + 1))
+
+    peq = {}
+    for index, symbol in enumerate(pattern):
+        peq[symbol] = peq.get(symbol, 0) | (1 << index)
+
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    vp, vn = full, 0
+    score = length
+    row = [score]
+    for symbol in text:
+        x = peq.get(symbol, 0) | vn
+        d0 = ((((x & vp) + vp) ^ vp) | x) & full
+        hp = vn | (full ^ (d0 | vp))
+        hn = vp & d0
+        if hp & last:
+            score += 1
+        elif hn & last:
+            score -= 1
+        hp = ((hp << 1) | 1) & full
+        vn = hp & d0
+        vp = ((hn << 1) & full) | (full ^ (d0 | hp))
+        row.append(score)
+    return row
+
+
+def _linear_editops(reference: Sequence,
+                    prediction: Sequence,
+                    max_cells: int = _MAX_CELLS) -> List[Tuple[str, int, int]]:
+    """Find an optimal sequence of edit operations with bounded memory.
+
+    Sub-problems that fit in `max_cells` are aligned by editops from python-Levenshtein,
+    larger ones are split in two with Hirschberg's method, so the alignment stays exact
+    whatever the length of texts (eg. whole volumes) while memory remains linear.
+
+    :Example:
+
+    >>> _linear_editops("le chat", "le chta", max_cells=4)
+    [('insert', 5, 5), ('delete', 6, 7)]
+
+    :param reference: source sequence
+    :type reference: str or list
+    :param prediction: destination sequence
+    :type prediction: str or list
+    :param max_cells: largest sub-problem aligned at once by editops. Defaults to `_MAX_CELLS`.
+    :type max_cells: int
+    :return: edit operations as editops from python-Levenshtein
+    :rtype: list
+    """
+    # largest sub-problem tried with editops, lowered below the size of a sub-problem that ran out of memory
+    budget = max_cells
+    if len(reference) * len(prediction) <= budget:
+        try:
+            return editops(reference, prediction)
+        except MemoryError:
+            budget = len(reference) * len(prediction) // 2
+
+    operations = []
+
+    def _align(start_ref: int, end_ref: int, start_pred: int, end_pred: int) -> None:
+        nonlocal budget
+        length_ref = end_ref - start_ref
+        length_pred = end_pred - start_pred
+        if length_ref < 2 or length_pred == 0 or length_ref * length_pred <= budget:
+            try:
+                operations.extend(
+                    (operation, index_ref + start_ref, index_pred + start_pred)
+                    for operation, index_ref, index_pred in editops(reference[start_ref:end_ref],
+                                                                    prediction[start_pred:end_pred]))
+                return
+            except MemoryError:
+                if length_ref < 2 or length_pred == 0:
+                    raise
+                # the halves are split again instead of retrying a sub-problem of the same size
+                budget = min(budget, length_ref * length_pred // 2)
+        middle = start_ref + length_ref // 2
+        prediction_part = prediction[start_pred:end_pred]
+        forward = _last_row(reference[start_ref:middle], prediction_part)
+        backward = _last_row(reference[middle:end_ref][::-1], prediction_part[::-1])
+        length_backward = len(backward) - 1
+        split = min(range(length_pred + 1), key=lambda j: forward[j] + backward[length_backward - j])
+        _align(start_ref, middle, start_pred, start_pred + split)
+        _align(middle, end_ref, start_pred + split, end_pred)
+
+    _align(0, len(reference), 0, len(prediction))
+    return operations
+
+
+def _as_codes(sequence: Sequence) -> np.ndarray:
+    """Convert a string (code points) or a sequence of integers to a NumPy array."""
+    if isinstance(sequence, str):
+        return np.frombuffer(sequence.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    return np.asarray(sequence)
+
+
+def _costs_scale(costs: Sequence[float]) -> int:
+    """Find the smallest factor that turns all costs into integers (0 if it exceeds `_MAX_COSTS_SCALE`)."""
+    scale = 1
+    for cost in costs:
+        denominator = Fraction(str(cost)).denominator
+        scale = scale * denominator // gcd(scale, denominator)
+        if scale > _MAX_COSTS_SCALE:
+            return 0
+    return scale
+
+
+def _weighted_distance(reference: Sequence,
+                       prediction: Sequence,
+                       insertion_cost: float = 1.0,
+                       deletion_cost: float = 1.0,
+                       substitution_cost: float = 1.0) -> float:
+    """Compute the weighted Levenshtein distance, the cost of the cheapest alignment with given costs.
+
+    Decimal costs (eg. 0.5 or 1.25) are scaled to integer weights and computed by python-Levenshtein,
+    other costs fall back to a row-wise dynamic programming vectorized with NumPy in linear memory.
+
+    :Example:
+
+    >>> _weighted_distance("chat", "chta", substitution_cost=0.5)
+    1.0
+    >>> _weighted_distance("chat", "chta", substitution_cost=3)
+    2.0
+
+    :param reference: source sequence
+    :type reference: str or list
+    :param prediction: destination sequence
+    :type prediction: str or list
+    :param insertion_cost: weight of an insertion. Defaults to 1.0.
+    :type insertion_cost: float
+    :param deletion_cost: weight of a deletion. Defaults to 1.0.
+    :type deletion_cost: float
+    :param substitution_cost: weight of a substitution. Defaults to 1.0.
+    :type substitution_cost: float
+    :return: weighted distance
+    :rtype: float
+    """
+    scale = _costs_scale([insertion_cost, deletion_cost, substitution_cost])
+    if scale:
+        weights = tuple(int(Fraction(str(cost)) * scale) for cost in (insertion_cost, deletion_cost, substitution_cost))
+        return distance(reference, prediction, weights=weights) / scale
+
+    # Python loop over the shortest sequence (rows), vectors over the longest one (columns)
+    if len(reference) > len(prediction):
+        reference, prediction = prediction, reference
+        insertion_cost, deletion_cost = deletion_cost, insertion_cost
+    for row in _iter_band_rows(reference, prediction, (insertion_cost, deletion_cost, substitution_cost),
+                               -len(reference), len(prediction)):
+        pass
+    # last cell of the table, on the diagonal len(prediction) - len(reference)
+    return round(float(row[len(prediction)]), 10)
+
+
+def _exceeds_distance(reference: Sequence,
+                      prediction: Sequence,
+                      bound: float,
+                      insertion_cost: float = 1.0,
+                      deletion_cost: float = 1.0,
+                      substitution_cost: float = 1.0) -> bool:
+    """Check if the weighted Levenshtein distance exceeds `bound`.
+
+    With costs scaled to integer weights (see :func: `_weighted_distance`), python-Levenshtein computes
+    a banded distance that stops as soon as it exceeds the bound, so badly recognised texts cost O(k.n).
+
+    :Example:
+
+    >>> _exceeds_distance("chat", "chut", 0.5, substitution_cost=0.5)
+    False
+
+    :param reference: source sequence
+    :type reference: str or list
+    :param prediction: destination sequence
+    :type prediction: str or list
+    :param bound: largest distance allowed
+    :type bound: float
+    :param insertion_cost: weight of an insertion. Defaults to 1.0.
+    :type insertion_cost: float
+    :param deletion_cost: weight of a deletion. Defaults to 1.0.
+    :type deletion_cost: float
+    :param substitution_cost: weight of a substitution. Defaults to 1.0.
+    :type substitution_cost: float
+    :return: `True` if the distance is greater than `bound`
+    :rtype: bool
+    """
+    costs = (insertion_cost, deletion_cost, substitution_cost)
+    scale = _costs_scale(costs)
+    if not scale:
+        return _weighted_distance(reference, prediction, *costs) > bound
+    weights = tuple(int(Fraction(str(cost)) * scale) for cost in costs)
+    # distances in weights are integers, so beyond the scaled bound rounded down they exceed it
+    cutoff = int(Fraction(str(bound)) * scale)
+    return distance(reference, prediction, weights=weights, score_cutoff=cutoff) > cutoff
+
+
+def _iter_band_rows(reference: Sequence,
+                    prediction: Sequence,
+                    costs: Tuple[float, float, float],
+                    low: int,
+                    high: int) -> Iterator[np.ndarray]:
+    """Yield the rows of the table of weighted costs, one for each prefix of `reference` (the first one
+    for the empty prefix), restricted to the diagonals `low` to `high` : item k of row i is the cost
+    against `prediction[:i + low + k]`, infinite outside of the table or of the band."""
+    insertion_cost, deletion_cost, substitution_cost = costs
+    length = len(prediction)
+    offsets = np.arange(low, high + 1)
+    width = len(offsets)
+    insertions = np.arange(width) * float(insertion_cost)
+    # codes of the predicted item before each cell of a row (row i starts at `codes[i]`),
+    # padded with -1 (matches nothing) outside of the prediction
+    codes = np.full(len(reference) + width + length + 1, -1, dtype=np.int64)
+    codes[1 - low:1 - low + length] = _as_codes(prediction)
+
+    row = np.where((offsets >= 0) & (offsets <= length), offsets * float(insertion_cost), np.inf)
+    yield row
+    for index, code in enumerate(_as_codes(reference), 1):
+        # substitutions (or matches) come from the same diagonal, deletions from the next one
+        current = row + np.where(codes[index:index + width] != code, substitution_cost, 0.0)
+        np.minimum(current[:-1], row[1:] + deletion_cost, out=current[:-1])
+        # insertions along the row : current[k] = min(current[l] + (k - l) * insertion_cost) for l <= k
+        row = np.minimum.accumulate(current - insertions) + insertions
+        row[max(length - index - low + 1, 0):] = np.inf
+        yield row
+
+
+def _band(length_ref: int, length_pred: int, cost: float, costs: Tuple[float, float, float]) -> Tuple[int, int]:
+    """Find the diagonals that an alignment of at most `cost` can go through : each step away from
+    the diagonal, and back to the diagonal of the last cell, is an insertion or a deletion."""
+    cheapest = min(costs[0], costs[1])
+    steps = length_ref + length_pred if cheapest <= 0 else int(cost / cheapest * (1 + 1e-9) + 1e-9)
+    shift = length_pred - length_ref
+    low = max(-length_ref, min(0, shift, (shift - steps) // 2))
+    high = min(length_pred, max(0, shift, -((steps + shift) // -2)))
+    return low, high
+
+
+def _backtrace(reference: Sequence,
+               prediction: Sequence,
+               costs: Tuple[float, float, float],
+               low: int,
+               high: int) -> List[Tuple[str, int, int]]:
+    """Find the edit operations of a cheapest alignment from the table of weighted costs in a band."""
+    insertion_cost, deletion_cost, substitution_cost = costs
+    table = np.array(list(_iter_band_rows(reference, prediction, costs, low, high)))
+
+    def _cost(index_ref: int, index_pred: int) -> float:
+        diagonal = index_pred - index_ref
+        return table.item(index_ref, diagonal - low) if low <= diagonal <= high else np.inf
+
+    def _reached(cost: float, previous: float) -> bool:
+        return abs(cost - previous) <= 1e-9 * max(1.0, abs(cost))
+
+    operations = []
+    index_ref, index_pred = len(reference), len(prediction)
+    while index_ref or index_pred:
+        cost = _cost(index_ref, index_pred)
+        if index_ref and index_pred:
+            match = reference[index_ref - 1] == prediction[index_pred - 1]
+            if _reached(cost, _cost(index_ref - 1, index_pred - 1) + (0.0 if match else substitution_cost)):
+                index_ref -= 1
+                index_pred -= 1
+                if not match:
+                    operations.append(("replace", index_ref, index_pred))
+                continue
+        if index_ref and _reached(cost, _cost(index_ref - 1, index_pred) + deletion_cost):
+            index_ref -= 1
+            operations.append(("delete", index_ref, index_pred))
+        else:
+            index_pred -= 1
+            operations.append(("insert", index_ref, index_pred))
+    operations.reverse()
+    return operations
+
+
+def _weighted_editops(reference: Sequence,
+                      prediction: Sequence,
+                      insertion_cost: float = 1.0,
+                      deletion_cost: float = 1.0,
+                      substitution_cost: float = 1.0,
+                      max_cells: int = _MAX_WEIGHTED_CELLS) -> List[Tuple[str, int, int]]:
+    """Find the edit operations of a cheapest alignment with given costs, with bounded memory.
+
+    Counterpart of :func: `_linear_editops` for other costs than 1, so counts of operations are those
+    of the alignment whose cost is the weighted distance (see :func: `_weighted_distance`). The table
+    of costs is only computed in the band of diagonals that an alignment as cheap as the unit-cost one
+    can go through, sub-problems that fit in `max_cells` are aligned by a backtrace in their table, larger ones are
+    split in two with Hirschberg's method.
+
+    :Example:
+
+    >>> _weighted_editops("chat", "chut", substitution_cost=3)
+    [('insert', 2, 2), ('delete', 2, 3)]
+
+    :param reference: source sequence
+    :type reference: str or list
+    :param prediction: destination sequence
+    :type prediction: str or list
+    :param insertion_cost: weight of an insertion. Defaults to 1.0.
+    :type insertion_cost: float
+    :param deletion_cost: weight of a deletion. Defaults to 1.0.
+    :type deletion_cost: float
+    :param substitution_cost: weight of a substitution. Defaults to 1.0.
+    :type substitution_cost: float
+    :param max_cells: largest sub-problem (cells of its band) aligned at once. Defaults to `_MAX_WEIGHTED_CELLS`.
+    :type max_cells: int
+    :return: edit operations as editops from python-Levenshtein
+    :rtype: list
+    """
+    # decimal costs are scaled to integers, so costs of the table are exact and ties are found
+    costs = (insertion_cost, deletion_cost, substitution_cost)
+    scale = _costs_scale(costs)
+    if scale:
+        costs = tuple(float(Fraction(str(cost)) * scale) for cost in costs)
+
+    operations = []
+
+    def _align(start_ref: int, end_ref: int, start_pred: int, end_pred: int, cost: float) -> None:
+        length_ref = end_ref - start_ref
+        length_pred = end_pred - start_pred
+        low, high = _band(length_ref, length_pred, cost, costs)
+        if length_ref < 2 or length_pred == 0 or (length_ref + 1) * (high - low + 1) <= max_cells:
+            operations.extend(
+                (operation, index_ref + start_ref, index_pred + start_pred)
+                for operation, index_ref, index_pred in _backtrace(reference[start_ref:end_ref],
+                                                                   prediction[start_pred:end_pred],
+                                                                   costs, low, high))
+            return
+        middle = start_ref + length_ref // 2
+        prediction_part = prediction[start_pred:end_pred]
+        # costs of the first half against every prefix of the prediction, and of the second half
+        # against every suffix (the band of the reversed problem has the same diagonals)
+        forward = np.full(length_pred + 1, np.inf)
+        backward = np.full(length_pred + 1, np.inf)
+        for row in _iter_band_rows(reference[start_ref:middle], prediction_part, costs, low, high):
+            pass
+        columns = middle - start_ref + np.arange(low, high + 1)
+        inside = (columns >= 0) & (columns <= length_pred)
+        forward[columns[inside]] = row[inside]
+        for row in _iter_band_rows(reference[middle:end_ref][::-1], prediction_part[::-1], costs, low, high):
+            pass
+        columns = end_ref - middle + np.arange(low, high + 1)
+        inside = (columns >= 0) & (columns <= length_pred)
+        backward[length_pred - columns[inside]] = row[inside]
+        split = int(np.argmin(forward + backward))
+        _align(start_ref, middle, start_pred, start_pred + split, float(forward[split]))
+        _align(middle, end_ref, start_pred + split, end_pred, float(backward[split]))
+
+    # the cost of the unit-cost alignment (fast to find) bounds the cost of the cheapest one, so its band
+    unit_operations = Counter(map(itemgetter(0), _linear_editops(reference, prediction)))
+    bound = sum(unit_operations[operation] * cost for operation, cost in zip(("insert", "delete", "replace"), costs))
+    _align(0, len(reference), 0, len(prediction), bound)
+    return operations
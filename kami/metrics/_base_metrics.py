@@ -6,50 +6,51 @@
 """
 
 import decimal
-from typing import Sequence, List
+import math
+from array import array
+from typing import Sequence
 
 __all__ = [
-    "_WordRegister",
-    "_hot_encode",
+    "_WordVocabulary",
     "_truncate_score",
-    "_get_percent"
+    "_get_percent",
+    "_safe_divide"
 ]
 
 
-class _WordRegister:
-    """A simple dictionnary with auto-incremental index"""
-    def __init__(self):
-        self._register = {}
-
-    def __getitem__(self, key: str):
-        if key in self._register:
-            val = self._register[key]
-        else:
-            self._register[key] = val = chr(0x0000 + len(self._register))
-        return val
+class _WordVocabulary:
+    """A register of words interned as integer ids, shared by all pairs of a corpus.
 
-    def __str__(self):
-        return f'Actual register : {self._register}'
+    :Example:
 
+    >>> vocabulary = _WordVocabulary()
+    >>> vocabulary.encode(["w1", "w2", "w3"]), vocabulary.encode(["w4", "w5", "w1"])
+    (array('i', [0, 1, 2]), array('i', [3, 4, 0]))
+    """
+    def __init__(self):
+        self._register = {}
 
-def _hot_encode(word_lists: Sequence[Sequence[str]]) -> List[str]:
-    """Pre-process the truth and hypothesis into a words form that Levenshtein can handle.
+    def __len__(self):
+        return len(self._register)
 
-    Take word_lists, transform them into hot-encoded strings.
+    def clear(self) -> None:
+        """Forget all words, ids of words encoded afterwards start again from 0."""
+        self._register.clear()
 
-    :Example:
+    def encode(self, words: Sequence[str]) -> array:
+        """Transform words into a compact array of int32 ids that Levenshtein can handle.
 
-    >>> list(_hot_encode([["w1", "w2", "w3"], ["w4", "w5", "w1"]]))
-    ['\x00\x01\x02', '\x03\x04\x00']
+        :param words: list of words
+        :type words: list
+        :return: ids of words
+        :rtype: array
+        """
+        register = self._register
+        # `len(register)` is evaluated before a new word is inserted
+        return array('i', [register.setdefault(word, len(register)) for word in words])
 
-    :param word_lists: List of List of words (generally 2)
-    :type word_lists: list
-    :return: hot-encoded string
-    :rtype: list
-    """
-    wtox = _WordRegister()
-    for word_list in word_lists:
-        yield "".join([wtox[word] for word in word_list])
+    def __str__(self):
+        return f'Actual register : {len(self._register)} words'
 
 
 def _truncate_score(score: float, round_digits: str) -> float:
@@ -69,6 +70,8 @@ def _truncate_score(score: float, round_digits: str) -> float:
     :return: result truncated
     :rtype: float
     """
+    if not math.isfinite(score):
+        return score
     result_truncate = float(
         decimal.Decimal(score).quantize(
             decimal.Decimal(round_digits),
@@ -90,3 +93,24 @@ def _get_percent(score: float) -> float:
     :rtype: float
     """
     return score * 100
+
+
+def _safe_divide(numerator: float, denominator: float) -> float:
+    """Divide a count of errors by a length, the rate of an empty reference
+    is 0.0 without errors and infinite otherwise (eg. a line only in prediction)
+
+    :Example:
+
+    >>> _safe_divide(3, 0)
+    inf
+
+    :param numerator: count of errors
+    :type numerator: float
+    :param denominator: length of reference
+    :type denominator: float
+    :return: rate
+    :rtype: float
+    """
+    if denominator:
+        return numerator / denominator
+    return float("inf") if numerator else 0.0
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Authors : Lucas Terriel <lucas.terriel@inria.fr>
+# Licence : MIT
+"""
+    The ``bootstrap`` module to compute confidence intervals of corpus scores
+    =========================================================================
+"""
+
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from .collector import ScoreCollector
+
+__all__ = [
+    "bootstrap_scores",
+    "paired_bootstrap",
+]
+
+# Corpus metrics resampled : (count of errors, length) columns of a ScoreCollector
+_BOOTSTRAP_METRICS = {
+    "cer": ("lev_distance_char", "length_char_reference"),
+    "wer": ("lev_distance_words", "length_words_reference"),
+}
+
+# Number of resampled lines drawn at once, bounds memory of the matrices of draws
+_BATCH_CELLS = 1 << 22
+
+
+def _counts_columns(scores: Union[ScoreCollector, Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Return the columns of counts needed by resampling (pairs above triage threshold are left out)."""
+    columns = scores.columns() if isinstance(scores, ScoreCollector) else scores
+    kept = ~np.asarray(columns["above_threshold"], dtype=bool) if "above_threshold" in columns else slice(None)
+    return {name: np.asarray(columns[name], dtype=np.float64)[kept]
+            for fields in _BOOTSTRAP_METRICS.values() for name in fields}
+
+
+def _resampled_sums(columns: Dict[str, np.ndarray],
+                    resamples: int,
+                    rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Sum each column over `resamples` resamplings (with replacement) of the lines.
+
+    Draws of a batch of resamples are turned into a matrix of how many times each line is drawn,
+    so sums of all columns are a single matrix product, and all columns share the same draws.
+    """
+    names = list(columns)
+    counts = np.stack([columns[name] for name in names], axis=1)
+    size = len(counts)
+    sums = np.empty((resamples, len(names)))
+    batch = max(1, _BATCH_CELLS // max(size, 1))
+    for start in range(0, resamples, batch):
+        stop = min(start + batch, resamples)
+        draws = rng.integers(0, size, size=(stop - start, size), dtype=np.int64 if size * batch > 2 ** 31 - 1 else np.int32)
+        # offset draws of each resample to count them all with a single bincount
+        draws += np.arange(stop - start, dtype=draws.dtype)[:, None] * size
+        weights = np.bincount(draws.ravel(), minlength=(stop - start) * size).reshape(stop - start, size)
+        sums[start:stop] = weights.astype(np.float64) @ counts
+    return {name: sums[:, index] for index, name in enumerate(names)}
+
+
+def _rates(errors: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Micro-averaged rates of resampled corpus, as `_safe_divide`."""
+    rates = np.where(errors != 0, np.inf, 0.0)
+    np.divide(errors, lengths, out=rates, where=lengths != 0)
+    return rates
+
+
+def _interval(point: float, samples: np.ndarray, confidence: float) -> Dict[str, float]:
+    """Percentile interval of samples around the corpus value."""
+    alpha = (1 - confidence) / 2
+    low, high = np.percentile(samples, [100 * alpha, 100 * (1 - alpha)])
+    return {"score": float(point), "low": float(low), "high": float(high), "std": float(np.std(samples))}
+
+
+def bootstrap_scores(scores: Union[ScoreCollector, Dict[str, np.ndarray]],
+                     resamples: int = 10000,
+                     confidence: float = 0.95,
+                     seed: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """Compute bootstrap confidence intervals of corpus CER and WER.
+
+    Lines are resampled with replacement and the counts of errors and lengths of each line
+    are summed, so the corpus scores of each resample are micro-averaged like :func: `score_corpus`.
+
+    :Example:
+
+    >>> collector = ScoreCollector()
+    >>> boards, corpus = score_corpus(lines_pairs, keep_boards=False, collector=collector)
+    >>> bootstrap_scores(collector, resamples=10000)["cer"]
+    {'score': 0.052, 'low': 0.047, 'high': 0.058, 'std': 0.0028}
+
+    :param scores: counts of each line, a :class: `ScoreCollector` or its columns
+    :type scores: ScoreCollector or dict
+    :param resamples: number of resampled corpus. Defaults to 10000.
+    :type resamples: int
+    :param confidence: level of intervals. Defaults to 0.95.
+    :type confidence: float
+    :param seed: seed of the random generator, for reproducible intervals. Defaults to None.
+    :type seed: int, optional
+    :return: for "cer" and "wer", the corpus score, bounds of interval and standard error
+    :rtype: dict
+    """
+    columns = _counts_columns(scores)
+    sums = _resampled_sums(columns, resamples, np.random.default_rng(seed))
+    return {metric: _interval(_rates(columns[errors].sum(), columns[lengths].sum()),
+                              _rates(sums[errors], sums[lengths]),
+                              confidence)
+            for metric, (errors, lengths) in _BOOTSTRAP_METRICS.items()}
+
+
+def paired_bootstrap(scores_a: Union[ScoreCollector, Dict[str, np.ndarray]],
+                     scores_b: Union[ScoreCollector, Dict[str, np.ndarray]],
+                     resamples: int = 10000,
+                     confidence: float = 0.95,
+                     seed: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """Compute paired bootstrap confidence intervals of the difference of corpus CER and WER (A - B)
+    between two predictions of the same ground truth (eg. from two Kraken models).
+
+    Both predictions are resampled with the same lines, so differences are paired by line.
+    Lines must be in the same order in both and lines above a triage threshold in either are left out.
+
+    :Example:
+
+    >>> paired_bootstrap(collector_model_a, collector_model_b)["cer"]
+    {'score': 0.011, 'low': 0.006, 'high': 0.016, 'std': 0.0025, 'p_value': 0.0002}
+
+    :param scores_a: counts of each line for the first prediction
+    :type scores_a: ScoreCollector or dict
+    :param scores_b: counts of each line for the second prediction
+    :type scores_b: ScoreCollector or dict
+    :param resamples: number of resampled corpus. Defaults to 10000.
+    :type resamples: int
+    :param confidence: level of intervals. Defaults to 0.95.
+    :type confidence: float
+    :param seed: seed of the random generator, for reproducible intervals. Defaults to None.
+    :type seed: int, optional
+    :return: for "cer" and "wer", the difference of corpus scores, bounds of interval, standard error
+    and the share of resamples where the difference has not the sign of the corpus difference ("p_value")
+    :rtype: dict
+    """
+    columns_a = scores_a.columns() if isinstance(scores_a, ScoreCollector) else scores_a
+    columns_b = scores_b.columns() if isinstance(scores_b, ScoreCollector) else scores_b
+    if len(columns_a["length_char_reference"]) != len(columns_b["length_char_reference"]):
+        raise ValueError("Both predictions must be scored on the same lines.")
+    kept = np.ones(len(columns_a["length_char_reference"]), dtype=bool)
+    for columns in (columns_a, columns_b):
+        if "above_threshold" in columns:
+            kept &= ~np.asarray(columns["above_threshold"], dtype=bool)
+
+    paired = {}
+    for suffix, columns in (("_a", columns_a), ("_b", columns_b)):
+        for fields in _BOOTSTRAP_METRICS.values():
+            for name in fields:
+                paired[name + suffix] = np.asarray(columns[name], dtype=np.float64)[kept]
+    sums = _resampled_sums(paired, resamples, np.random.default_rng(seed))
+
+    intervals = {}
+    for metric, (errors, lengths) in _BOOTSTRAP_METRICS.items():
+        point = _rates(paired[errors + "_a"].sum(), paired[lengths + "_a"].sum()) - \
+            _rates(paired[errors + "_b"].sum(), paired[lengths + "_b"].sum())
+        differences = _rates(sums[errors + "_a"], sums[lengths + "_a"]) - \
+            _rates(sums[errors + "_b"], sums[lengths + "_b"])
+        intervals[metric] = _interval(point, differences, confidence)
+        intervals[metric]["p_value"] = float(np.mean(differences <= 0) if point > 0 else np.mean(differences >= 0))
+    return intervals
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Authors : Lucas Terriel <lucas.terriel@inria.fr>
+# Licence : MIT
+"""
+    The ``cache`` module to re-score corpus incrementally
+    =====================================================
+"""
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from typing import Optional, Tuple, Union
+
+__all__ = [
+    "AlignmentCache",
+]
+
+
+class AlignmentCache:
+    """A persistent cache of operation counts of aligned (reference, prediction) pairs,
+    generally lines, with a size bound and least recently used (LRU) eviction.
+
+    Keys are hashes of the content of pairs and of the operations costs, so after a new
+    training of a model only lines that changed are aligned again when the corpus is
+    re-scored with :func: `score_corpus`.
+
+    :Example:
+
+    >>> cache = AlignmentCache(maxsize=100000, path="./alignments.pkl")
+    >>> boards, corpus = score_corpus(lines_pairs, cache=cache)
+    >>> cache.save()
+
+    Parameters
+    ----------
+        :param maxsize: Maximum number of pairs in cache. Defaults to 1000000.
+        :type maxsize: int
+        :param path: Path to a file where cache is saved, loaded if it exists. Defaults to None.
+        :type path: str, optional
+
+    Attributes
+    ----------
+        :ivar maxsize: see also `Parameters` section for more details.
+        :type maxsize: int
+        :ivar path: see also `Parameters` section for more details.
+        :type path: str
+        :ivar hits: number of pairs found in cache.
+        :type hits: int
+        :ivar misses: number of pairs not found in cache.
+        :type misses: int
+    """
+
+    def __init__(self, maxsize: int = 1000000, path: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if path is not None and os.path.isfile(path):
+            with open(path, "rb") as fh:
+                self._entries = pickle.load(fh)
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._entries
+
+    @staticmethod
+    def key(reference: str,
+            prediction: str,
+            insertion_cost: float = 1.0,
+            deletion_cost: float = 1.0,
+            substitution_cost: float = 1.0,
+            confusions: bool = False,
+            split_punctuation: bool = False) -> bytes:
+        """Hash a pair, the operations costs used to align it, if confusions are counted
+        and if punctuation is split from words."""
+        content = hashlib.blake2b(digest_size=16)
+        # costs as floats, so 1 and 1.0 give the same key
+        content.update(f"{float(insertion_cost)!r}\x1f{float(deletion_cost)!r}\x1f{float(substitution_cost)!r}"
+                       f"\x1f{bool(confusions)}".encode("utf-8"))
+        # keys of pairs tokenized on whitespace are unchanged from caches saved before this option
+        content.update(b"\x1fsplit_punctuation\x1e" if split_punctuation else b"\x1e")
+        content.update(reference.encode("utf-8", "surrogatepass"))
+        content.update(b"\x1e")
+        content.update(prediction.encode("utf-8", "surrogatepass"))
+        return content.digest()
+
+    def get(self, key: bytes) -> Optional[Tuple[Union[int, float, str], ...]]:
+        """Return counts of a pair (and mark it as recently used) or None if pair is not in cache."""
+        counts = self._entries.get(key)
+        if counts is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return counts
+
+    def put(self, key: bytes, counts: Tuple[Union[int, float, str], ...]) -> None:
+        """Add counts of a pair, the least recently used pairs are evicted beyond `maxsize`."""
+        self._entries[key] = counts
+        self._entries.move_to_end(key)
+        self._evict()
+
+    def clear(self) -> None:
+        """Remove all pairs from cache."""
+        self._entries.clear()
+
+    def save(self, path: Optional[str] = None) -> None:
+        """Save cache to `path` (defaults to the path of cache)."""
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the cache.")
+        with open(path, "wb") as fh:
+            pickle.dump(self._entries, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _evict(self) -> None:
+        """Remove least recently used pairs beyond `maxsize`."""
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Authors : Lucas Terriel <lucas.terriel@inria.fr>
+# Licence : MIT
+"""
+    The ``collector`` module to store scores of pairs in columns
+    =============================================================
+"""
+
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from .legacy._shared_lib import batch_metrics
+
+__all__ = [
+    "ScoreCollector",
+]
+
+# Columns of counts (see `_COUNT_FIELDS` of evaluation module, without confusions)
+_INT_COLUMNS = (
+    "length_char_reference",
+    "length_char_prediction",
+    "length_words_reference",
+    "length_words_prediction",
+    "hits",
+    "substs",
+    "deletions",
+    "insertions",
+    "word_substs",
+    "word_deletions",
+    "word_insertions",
+)
+_FLOAT_COLUMNS = (
+    "substs_weighted",
+    "deletions_weighted",
+    "insertions_weighted",
+    "word_substs_weighted",
+    "word_deletions_weighted",
+    "word_insertions_weighted",
+    "lev_distance_char",
+    "lev_distance_words",
+    "hamming",
+)
+# Columns of counts in the order of `_COUNT_FIELDS`
+_COLUMNS = _INT_COLUMNS[:8] + _FLOAT_COLUMNS[:3] + _INT_COLUMNS[8:] + _FLOAT_COLUMNS[3:]
+_METRICS_COLUMNS = ("wer", "wer_hunt", "cer", "wacc", "cip", "cil", "mer")
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Vectorized version of `_safe_divide` : rates of empty references are 0.0 without errors else infinite."""
+    rates = np.where(numerator != 0, np.inf, 0.0)
+    np.divide(numerator, denominator, out=rates, where=denominator != 0)
+    return rates
+
+
+def _numpy_metrics(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Compute metrics of all pairs from columns of counts with NumPy (fallback of the C batch kernel)."""
+    length_reference = columns["length_char_reference"].astype(np.float64)
+    length_prediction = columns["length_char_prediction"].astype(np.float64)
+    length_words_reference = columns["length_words_reference"].astype(np.float64)
+    hits = columns["hits"].astype(np.float64)
+    errors = (columns["substs"] + columns["deletions"] + columns["insertions"]).astype(np.float64)
+
+    # weighted counts are equal to counts with unit costs, so Hunt WER is always computed from them
+    wer = _divide(columns["lev_distance_words"], length_words_reference)
+    defined = (length_reference != 0) & (length_prediction != 0)
+    preserved = np.zeros(len(hits))
+    np.multiply(hits / np.where(defined, length_reference, 1.0),
+                hits / np.where(defined, length_prediction, 1.0),
+                out=preserved, where=defined)
+    metrics = {
+        "wer": wer,
+        "wer_hunt": _divide(columns["word_substs_weighted"]
+                            + 0.5 * columns["word_deletions_weighted"]
+                            + 0.5 * columns["word_insertions_weighted"], length_words_reference),
+        "cer": _divide(columns["lev_distance_char"], length_reference),
+        "wacc": 1 - wer,
+        "cip": preserved,
+        "cil": np.where(defined, 1 - preserved, 0.0),
+        "mer": _divide(errors, hits + errors),
+    }
+    for name in _METRICS_COLUMNS:
+        metrics[name][columns["above_threshold"]] = np.nan
+    return metrics
+
+
+class ScoreCollector:
+    """A columnar store of the counts and metrics of each scored (reference, prediction) pair.
+
+    Counts are appended in growable NumPy arrays, one per column, instead of a board (dict)
+    per pair, then metrics are computed for all pairs at once and written in bulk
+    to a `.npz` archive or a CSV file.
+
+    Pairs above the triage threshold (see `max_cer` and `max_distance` options of :class: `Scorer`)
+    keep their lengths of characters, other integer counts are -1 and float counts and metrics are NaN.
+    Hamming distance is NaN if lengths of strings differ.
+
+    :Example:
+
+    >>> collector = ScoreCollector()
+    >>> boards, corpus = score_corpus(lines_pairs, keep_boards=False, collector=collector)
+    >>> collector.to_npz("./scores.npz")
+
+    Parameters
+    ----------
+        :param capacity: Number of pairs allocated at first, arrays grow as needed. Defaults to 1024.
+        :type capacity: int
+
+    Attributes
+    ----------
+        :ivar size: number of pairs collected.
+        :type size: int
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.size = 0
+        self._capacity = max(int(capacity), 1)
+        self._columns = {name: np.empty(self._capacity, dtype=np.int64 if name in _INT_COLUMNS else np.float64)
+                         for name in _COLUMNS}
+        self._columns["above_threshold"] = np.empty(self._capacity, dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, scorer) -> None:
+        """Add the counts of a :class: `Scorer`."""
+        self._add(scorer._counts(), scorer.length_char_reference, scorer.length_char_prediction)
+
+    def _add(self,
+             counts: Optional[Sequence[Union[int, float, str]]],
+             length_char_reference: int,
+             length_char_prediction: int) -> None:
+        """Add the counts of a pair in `_COUNT_FIELDS` order (None if pair is above triage threshold)."""
+        if self.size == self._capacity:
+            self._grow()
+        row = self.size
+        columns = self._columns
+        if counts is None:
+            for name in _INT_COLUMNS:
+                columns[name][row] = -1
+            for name in _FLOAT_COLUMNS:
+                columns[name][row] = np.nan
+            columns["length_char_reference"][row] = length_char_reference
+            columns["length_char_prediction"][row] = length_char_prediction
+            columns["above_threshold"][row] = True
+        else:
+            (columns["length_char_reference"][row],
+             columns["length_char_prediction"][row],
+             columns["length_words_reference"][row],
+             columns["length_words_prediction"][row],
+             columns["hits"][row],
+             columns["substs"][row],
+             columns["deletions"][row],
+             columns["insertions"][row],
+             columns["substs_weighted"][row],
+             columns["deletions_weighted"][row],
+             columns["insertions_weighted"][row],
+             columns["word_substs"][row],
+             columns["word_deletions"][row],
+             columns["word_insertions"][row],
+             columns["word_substs_weighted"][row],
+             columns["word_deletions_weighted"][row],
+             columns["word_insertions_weighted"][row],
+             columns["lev_distance_char"][row],
+             columns["lev_distance_words"][row]) = counts[:19]
+            columns["hamming"][row] = np.nan if counts[19] == "Ø" else counts[19]
+            columns["above_threshold"][row] = False
+        self.size += 1
+
+    def _grow(self) -> None:
+        """Double the capacity of all columns."""
+        self._capacity *= 2
+        for name, column in self._columns.items():
+            grown = np.empty(self._capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self._columns[name] = grown
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Return counts and metrics of all pairs, one array (of `size` rows) per column.
+
+        Metrics are computed as in :class: `Scorer`, without display options (percent, truncation),
+        in one call of the C batch kernel if the shared library is built, else with NumPy.
+        """
+        columns = {name: column[:self.size] for name, column in self._columns.items()}
+        metrics = batch_metrics(columns)
+        if metrics is None:
+            metrics = _numpy_metrics(columns)
+        for name in _METRICS_COLUMNS:
+            columns[name] = metrics[name]
+        return columns
+
+    def to_npz(self, path: str, compressed: bool = True) -> None:
+        """Write all columns to a NumPy `.npz` archive (loaded with `numpy.load`)."""
+        save = np.savez_compressed if compressed else np.savez
+        save(path, **self.columns())
+
+    def to_csv(self, path: str, delimiter: str = ",") -> None:
+        """Write all columns to a CSV file with a header, one pair per row."""
+        columns = self.columns()
+        names = list(columns)
+        table = np.empty(self.size, dtype=[(name, columns[name].dtype) for name in names])
+        for name in names:
+            table[name] = columns[name]
+        formats = ["%d" if columns[name].dtype != np.float64 else "%.10g" for name in names]
+        np.savetxt(path, table, fmt=formats, delimiter=delimiter, header=delimiter.join(names), comments="")
@@ -6,23 +6,112 @@
     ======================================================================
 """
 
-from typing import Sequence, Tuple, Union
-from Levenshtein import (distance,
-                         hamming,
-                         editops)
+from collections import Counter
+from fractions import Fraction
+from itertools import islice
+from multiprocessing import Pool
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from Levenshtein import hamming
+from ._alignment import (_exceeds_distance,
+                         _linear_editops,
+                         _weighted_editops)
+from kami.kamutils._tokenizer import _Tokenizer
+from .cache import AlignmentCache
+from .collector import ScoreCollector
 from ._base_metrics import (_truncate_score,
-                            _hot_encode,
-                            _get_percent)
+                            _WordVocabulary,
+                            _get_percent,
+                            _safe_divide)
 
 __all__ = [
     "Scorer",
+    "score_corpus",
 ]
 
+# Additive counts carried from each scored pair to the corpus totals
+_COUNT_FIELDS = (
+    "length_char_reference",
+    "length_char_prediction",
+    "length_words_reference",
+    "length_words_prediction",
+    "hits",
+    "substs",
+    "deletions",
+    "insertions",
+    "substs_weighted",
+    "deletions_weighted",
+    "insertions_weighted",
+    "word_substs",
+    "word_deletions",
+    "word_insertions",
+    "word_substs_weighted",
+    "word_deletions_weighted",
+    "word_insertions_weighted",
+    "lev_distance_char",
+    "lev_distance_words",
+    "hamming",
+    "confusions",
+)
+# Counts from the alignment of characters, computed together on demand
+_CHAR_FIELDS = (
+    "hits",
+    "substs",
+    "deletions",
+    "insertions",
+    "substs_weighted",
+    "deletions_weighted",
+    "insertions_weighted",
+    "lev_distance_char",
+    "confusions",
+)
+# Counts from the alignment of words, computed together on demand
+_WORD_FIELDS = (
+    "length_words_reference",
+    "length_words_prediction",
+    "word_substs",
+    "word_deletions",
+    "word_insertions",
+    "word_substs_weighted",
+    "word_deletions_weighted",
+    "word_insertions_weighted",
+    "lev_distance_words",
+)
+
+
+class _Count:
+    """A read-only count of :class: `Scorer`, only the alignment it comes from (of characters
+    or of words, see `_CHAR_FIELDS` and `_WORD_FIELDS`) is computed when it is read."""
+
+    __slots__ = ("_name", "_getter", "_index")
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._name = name
+        if name == "hamming":
+            self._getter, self._index = "_get_hamming", None
+        elif name in _CHAR_FIELDS:
+            self._getter, self._index = "_get_char_counts", _CHAR_FIELDS.index(name)
+        else:
+            self._getter, self._index = "_get_word_counts", _WORD_FIELDS.index(name)
+
+    def __get__(self, scorer: Optional["Scorer"], owner: Optional[type] = None) -> Union[int, float, str, Counter, None]:
+        if scorer is None:
+            return self
+        counts = getattr(scorer, self._getter)()
+        return counts if counts is None or self._index is None else counts[self._index]
+
+    def __set__(self, scorer: "Scorer", value) -> None:
+        raise AttributeError(f"can't set attribute '{self._name}'")
+
 
 class Scorer:
     """This class calculates the set of HTR / OCR scores.
     User can accesses directly to metrics/scores via the attributes of the :class: `Scorer` class
     in constructor method or via :class: `Kami` facade class.
+
+    Scores are lazily evaluated : the alignments of characters and words are computed once,
+    when a first score is read, and all counts, distances and metrics derive from them.
     Parameters
     ----------
         :param reference: Ground-truth text or string.
@@ -43,6 +132,21 @@ class Scorer:
         :type truncate_score: bool, optional
         :param round_digits: Set the number of digits after floating point in string form, defaults to '.01'.
         :type round_digits: str, optional
+        :param max_cer: triage bound on the character error rate (as a ratio, eg. 0.05), if exceeded
+        the scoring stops early and the pair is only reported as above threshold, defaults to None.
+        :type max_cer: float, optional
+        :param max_distance: triage bound on the character edit distance, see :param: `max_cer`, defaults to None.
+        :type max_distance: int, optional
+        :param vocabulary: register of words ids to reuse between pairs of a corpus, defaults to None (a new one).
+        :type vocabulary: _WordVocabulary, optional
+        :param confusions: `True` to count confusions between characters from the alignment, defaults to False.
+        :type confusions: bool, optional
+        :param keep_texts: `False` to align strings immediately and drop them from the object
+        (:ivar: `reference` and :ivar: `prediction` are then None) to save memory, defaults to True.
+        :type keep_texts: bool, optional
+        :param split_punctuation: `True` to split punctuation signs from words (each one is a word) for word-based
+        scores, else words are split on whitespace only, defaults to False.
+        :type split_punctuation: bool, optional
     Attributes
     ----------
         :ivar _opt_percent: Option to show result in percent.
@@ -96,10 +200,62 @@ class Scorer:
         :type deletions: int
         :ivar insertions: number of characters inserted between reference and prediction string
         :type insertions: int
+        :ivar max_distance: Bound on the character edit distance from :param: `max_cer` and :param: `max_distance`
+        :type max_distance: int or None
+        :ivar above_threshold: `True` if the character edit distance exceeds `max_distance`,
+        in this case only lengths are computed and other scores are None
+        :type above_threshold: bool
+        :ivar confusions: Counts of (reference character, predicted character) pairs of substitutions,
+        deletions (predicted character is "") and insertions (reference character is ""), mergeable with
+        other pairs or pages by addition (None if not requested)
+        :type confusions: Counter
         :ivar board: A benchmark of all metrics
         :type board: dict
     """
 
+    __slots__ = (
+        "_opt_percent",
+        "_opt_confusions",
+        "_opt_truncate",
+        "_round_digits",
+        "_vocabulary",
+        "_tokenizer",
+        "_char_counts",
+        "_word_counts",
+        "_hamming",
+        "_board",
+        "reference",
+        "prediction",
+        "insertion_cost",
+        "deletion_cost",
+        "substitution_cost",
+        "length_char_reference",
+        "length_char_prediction",
+        "max_distance",
+        "above_threshold",
+    )
+
+    # Counts (see `_COUNT_FIELDS`), computed on demand
+    length_words_reference = _Count()
+    length_words_prediction = _Count()
+    hits = _Count()
+    substs = _Count()
+    deletions = _Count()
+    insertions = _Count()
+    substs_weighted = _Count()
+    deletions_weighted = _Count()
+    insertions_weighted = _Count()
+    word_substs = _Count()
+    word_deletions = _Count()
+    word_insertions = _Count()
+    word_substs_weighted = _Count()
+    word_deletions_weighted = _Count()
+    word_insertions_weighted = _Count()
+    lev_distance_char = _Count()
+    lev_distance_words = _Count()
+    hamming = _Count()
+    confusions = _Count()
+
     def __init__(self,
                  reference: str,
                  prediction: str,
@@ -108,10 +264,17 @@ class Scorer:
                  substitution_cost: float = 1.0,
                  show_percent: bool = False,
                  truncate_score: bool = False,
-                 round_digits: str = '.01') -> None:
+                 round_digits: str = '.01',
+                 max_cer: Optional[float] = None,
+                 max_distance: Optional[int] = None,
+                 vocabulary: Optional[_WordVocabulary] = None,
+                 confusions: bool = False,
+                 keep_texts: bool = True,
+                 split_punctuation: bool = False) -> None:
 
         # Scores display options
         self._opt_percent = show_percent
+        self._opt_confusions = confusions
         self._opt_truncate = truncate_score
         self._round_digits = round_digits
 
@@ -127,49 +290,182 @@ class Scorer:
         # Length set of sentences
         self.length_char_reference = len(reference)
         self.length_char_prediction = len(prediction)
-        self.length_words_reference = len(reference.split())
-        self.length_words_prediction = len(prediction.split())
-
-        # Strings operations (weighted and unweighted / char-based and word-based)
-        self.hits, self.substs, self.deletions, self.insertions, self.substs_weighted, self.deletions_weighted, self.insertions_weighted, self.word_substs, self.word_deletions, self.word_insertions, self.word_substs_weighted, self.word_deletions_weighted, self.word_insertions_weighted = self._get_operation_counts()
-
-        # Distances
-        if self.insertion_cost == 1 and self.deletion_cost == 1 and self.substitution_cost == 1:
-            self.lev_distance_words, self.lev_distance_char = self._levensthein_distance()
-        else:
-            self.lev_distance_words, self.lev_distance_char = self._weighted_levensthein_distance()
-
-        self.hamming = self._hamming_distance()
-
-        # HTR/OCR Metrics
-        self.wer = self._wer()
-        self.wer_hunt = self._wer_hunt()
-        self.cer = self._cer()
-        self.wacc = self._wacc()
-        self.cip = self._cip()
-        self.cil = self._cil()
-        self.mer = self._mer()
 
+        # Alignments (of characters and of words) and board are computed on demand
+        self._vocabulary = vocabulary
+        self._tokenizer = _Tokenizer(split_punctuation)
+        self._char_counts = None
+        self._word_counts = None
+        self._hamming = None
+        self._board = None
+
+        # Triage : a banded computation stops as soon as the distance exceeds the bound,
+        # so badly recognised texts cost O(k.n) instead of a full alignment
+        self.max_distance = self._get_max_distance(max_cer, max_distance)
+        self.above_threshold = self.max_distance is not None and _exceeds_distance(
+            reference, prediction, self.max_distance, insertion_cost, deletion_cost, substitution_cost)
+
+        if not keep_texts:
+            self._get_char_counts()
+            self._get_word_counts()
+            self._get_hamming()
+            self.reference = None
+            self.prediction = None
+
+    @classmethod
+    def batch(cls,
+              pairs: Iterable[Tuple[str, str]],
+              workers: int = 1,
+              chunk_size: int = 256,
+              **options) -> Tuple[List[dict], dict]:
+        """Score a corpus of (reference, prediction) pairs, see :func: `score_corpus`."""
+        return score_corpus(pairs, workers=workers, chunk_size=chunk_size, **options)
+
+    @classmethod
+    def _from_totals(cls,
+                     totals: Sequence[Union[int, float, str]],
+                     insertion_cost: float = 1.0,
+                     deletion_cost: float = 1.0,
+                     substitution_cost: float = 1.0,
+                     show_percent: bool = False,
+                     truncate_score: bool = False,
+                     round_digits: str = '.01',
+                     confusions: bool = False,
+                     **_) -> "Scorer":
+        """Build a Scorer from counts already summed (see `_COUNT_FIELDS`) without aligning any text,
+        other options of Scorer (triage, tokenization, texts) do not apply to counts and are ignored."""
+        scorer = cls.__new__(cls)
+        scorer._opt_percent = show_percent
+        scorer._opt_confusions = confusions
+        scorer._opt_truncate = truncate_score
+        scorer._round_digits = round_digits
+        scorer._vocabulary = None
+        scorer._tokenizer = None
+        scorer._board = None
+        scorer.reference = None
+        scorer.prediction = None
+        scorer.insertion_cost = insertion_cost
+        scorer.deletion_cost = deletion_cost
+        scorer.substitution_cost = substitution_cost
+        counts = dict(zip(_COUNT_FIELDS, totals))
+        scorer.length_char_reference = counts["length_char_reference"]
+        scorer.length_char_prediction = counts["length_char_prediction"]
+        scorer._char_counts = tuple(counts[field] for field in _CHAR_FIELDS)
+        scorer._word_counts = tuple(counts[field] for field in _WORD_FIELDS)
+        scorer._hamming = counts["hamming"]
+        scorer.max_distance = None
+        scorer.above_threshold = False
+        return scorer
+
+    @classmethod
+    def _from_counts(cls,
+                     counts: Sequence[Union[int, float, str]],
+                     max_cer: Optional[float] = None,
+                     max_distance: Optional[int] = None,
+                     **options) -> "Scorer":
+        """Build the Scorer of one pair from its counts (eg. from a cache) and apply triage options."""
+        scorer = cls._from_totals(_copy_counts(counts), **options)
+        scorer.max_distance = scorer._get_max_distance(max_cer, max_distance)
+        scorer.above_threshold = scorer.max_distance is not None and scorer.lev_distance_char > scorer.max_distance
+        return scorer
+
+    def _get_char_counts(self) -> Optional[Tuple[Union[int, float, Counter], ...]]:
+        """Return counts from the alignment of characters (`_CHAR_FIELDS`), computed once."""
+        if self._char_counts is None and not self.above_threshold:
+            self._char_counts = self._align_chars()
+        return self._char_counts
+
+    def _get_word_counts(self) -> Optional[Tuple[Union[int, float], ...]]:
+        """Return counts from the alignment of words (`_WORD_FIELDS`), computed once."""
+        if self._word_counts is None and not self.above_threshold:
+            self._word_counts = self._align_words()
+            self._vocabulary = None
+            self._tokenizer = None
+        return self._word_counts
+
+    def _get_hamming(self) -> Union[str, int, None]:
+        """Return the Hamming distance, computed once."""
+        if self._hamming is None and not self.above_threshold:
+            self._hamming = self._hamming_distance()
+        return self._hamming
+
+    def _counts(self) -> Optional[Tuple[Union[int, float, str], ...]]:
+        """Return the additive counts of this pair in `_COUNT_FIELDS` order (None if above threshold)."""
+        if self.above_threshold:
+            return None
+        counts = dict(zip(_CHAR_FIELDS, self._get_char_counts()))
+        counts.update(zip(_WORD_FIELDS, self._get_word_counts()))
+        counts["length_char_reference"] = self.length_char_reference
+        counts["length_char_prediction"] = self.length_char_prediction
+        counts["hamming"] = self._get_hamming()
+        return tuple(counts[field] for field in _COUNT_FIELDS)
+
+    def _display(self, score: float) -> float:
+        """Apply display options (percent, truncation) to a score."""
         if self._opt_percent:
-            self.wer = _get_percent(self.wer)
-            self.wer_hunt = _get_percent(self.wer_hunt)
-            self.cer = _get_percent(self.cer)
-            self.wacc = _get_percent(self.wacc)
-            self.cip = _get_percent(self.cip)
-            self.cil = _get_percent(self.cil)
-            self.mer = _get_percent(self.mer)
-
+            score = _get_percent(score)
         if self._opt_truncate:
-            self.wer = _truncate_score(self.wer, self._round_digits)
-            self.wer_hunt = _truncate_score(self.wer_hunt, self._round_digits)
-            self.cer = _truncate_score(self.cer, self._round_digits)
-            self.wacc = _truncate_score(self.wacc, self._round_digits)
-            self.cip = _truncate_score(self.cip, self._round_digits)
-            self.cil = _truncate_score(self.cil, self._round_digits)
-            self.mer = _truncate_score(self.mer, self._round_digits)
-
-        # Summary of all metrics
-        self.board = {
+            score = _truncate_score(score, self._round_digits)
+        return score
+
+    # HTR/OCR Metrics (None if above triage threshold) #
+
+    @property
+    def wer(self) -> Optional[float]:
+        """Word Error Rate"""
+        return None if self.above_threshold else self._display(self._wer())
+
+    @property
+    def wer_hunt(self) -> Optional[float]:
+        """Hunt word error rate"""
+        return None if self.above_threshold else self._display(self._wer_hunt())
+
+    @property
+    def cer(self) -> Optional[float]:
+        """Character Error Rate"""
+        return None if self.above_threshold else self._display(self._cer())
+
+    @property
+    def wacc(self) -> Optional[float]:
+        """Word Accuracy"""
+        return None if self.above_threshold else self._display(self._wacc())
+
+    @property
+    def cip(self) -> Optional[float]:
+        """Character Information Preserved"""
+        return None if self.above_threshold else self._display(self._cip())
+
+    @property
+    def cil(self) -> Optional[float]:
+        """Character Information Lost"""
+        return None if self.above_threshold else self._display(self._cil())
+
+    @property
+    def mer(self) -> Optional[float]:
+        """Match Error Rate"""
+        return None if self.above_threshold else self._display(self._mer())
+
+    @property
+    def board(self) -> dict:
+        """A benchmark of all metrics"""
+        if self._board is None:
+            self._board = self._get_board()
+        return self._board
+
+    @board.setter
+    def board(self, board: dict) -> None:
+        self._board = board
+
+    def _get_board(self) -> dict:
+        """Summary of all metrics."""
+        if self.above_threshold:
+            return {
+                "above_threshold": True,
+                "max_distance": self.max_distance,
+                "Length_reference": self.length_char_reference,
+                "Length_prediction": self.length_char_prediction
+            }
+        board = {
             "levensthein_distance_char": self.lev_distance_char,
             "levensthein_distance_words": self.lev_distance_words,
             "hamming_distance": self.hamming,
@@ -187,32 +483,66 @@ class Scorer:
             "Length_reference": self.length_char_reference,
             "Length_prediction": self.length_char_prediction
         }
+        if self.confusions is not None:
+            board["confusions"] = self.confusions
+        if self.max_distance is not None:
+            board["above_threshold"] = False
+        return board
+
+    def _get_max_distance(self, max_cer: Optional[float], max_distance: Optional[int]) -> Union[int, float, None]:
+        """Compute the triage bound on character edit distance (the tightest of both options),
+        a bound on the weighted distance keeps its decimals with other costs than 1."""
+        unit_costs = self._unit_costs()
+        bounds = []
+        if max_cer is not None:
+            # product of the decimal rate, so eg. 0.29 * 100 gives 29 and not 28.999999999999996
+            bound = Fraction(str(max_cer)) * self.length_char_reference
+            bounds.append(int(bound) if unit_costs else round(float(bound), 10))
+        if max_distance is not None:
+            bounds.append(int(max_distance) if unit_costs else max_distance)
+        return min(bounds) if bounds else None
+
+    def _unit_costs(self) -> bool:
+        """`True` if all operations cost 1 (distances are then the numbers of operations)."""
+        return self.insertion_cost == 1 and self.deletion_cost == 1 and self.substitution_cost == 1
+
+    def _editops(self, reference: Sequence, prediction: Sequence) -> List[Tuple[str, int, int]]:
+        """Find the edit operations of a cheapest alignment with the costs of the scorer."""
+        # Long texts (eg. whole volumes) are aligned exactly with bounded memory
+        if self._unit_costs():
+            return _linear_editops(reference, prediction)
+        # with other costs, counts come from the cheapest alignment (not the unit-cost one weighted),
+        # so they add up to the weighted distance
+        return _weighted_editops(reference, prediction,
+                                 self.insertion_cost, self.deletion_cost, self.substitution_cost)
+
+    def _weighted_counts(self, operations: Counter) -> Tuple[Union[int, float], ...]:
+        """Compute counts, weighted counts and distance from the operations of an alignment."""
+        substs, deletions, insertions = operations["replace"], operations["delete"], operations["insert"]
+        weighted = (substs * self.substitution_cost, deletions * self.deletion_cost, insertions * self.insertion_cost)
+        # An alignment from editops is optimal, so its number of operations is the distance
+        lev_distance = substs + deletions + insertions if self._unit_costs() else round(sum(weighted), 10)
+        return (substs, deletions, insertions) + weighted + (lev_distance,)
+
+    def _align_chars(self) -> Tuple[Union[int, float, Counter], ...]:
+        """Align characters and compute counts and distance of characters (`_CHAR_FIELDS`)."""
+        result_editops_char = self._editops(self.reference, self.prediction)
+        counts = self._weighted_counts(Counter(map(itemgetter(0), result_editops_char)))
+        return ((self.length_char_reference - (counts[0] + counts[1]),)
+                + counts
+                + (self._count_confusions(result_editops_char) if self._opt_confusions else None,))
+
+    def _align_words(self) -> Tuple[Union[int, float], ...]:
+        """Align words (as ids) and compute counts and distance of words (`_WORD_FIELDS`)."""
+        words_reference = self._tokenizer.tokens(self.reference)
+        words_prediction = self._tokenizer.tokens(self.prediction)
+        vocabulary = _WordVocabulary() if self._vocabulary is None else self._vocabulary
+        encoded_words = (vocabulary.encode(words_reference), vocabulary.encode(words_prediction))
+
+        operations = Counter(map(itemgetter(0), self._editops(*encoded_words)))
+        return (len(words_reference), len(words_prediction)) + self._weighted_counts(operations)
 
     # Collection of distance metrics #
-    def _levensthein_distance(self) -> Tuple[float, float]:
-        """Compute Levensthein distance from C extension module Python-Levensthein.
-
-        Returns:
-            Tuple[float, float]: weighted levensthein distance based on char level, weighted levensthein distance based on word level
-        """
-        return distance(*_hot_encode(
-            [self.reference.split(), self.prediction.split()])), distance(self.reference, self.prediction)
-
-    def _weighted_levensthein_distance(self) -> Tuple[float, float]:
-        """Compute Levensthein distance from predefined cost.
-        Returns:
-            Tuple[float, float]: weighted levensthein distance based on word level, weighted levensthein distance based on char level
-        """
-        return sum(
-            [self.word_substs_weighted,
-             self.word_deletions_weighted,
-             self.word_insertions_weighted]
-        ), sum(
-            [self.substs_weighted,
-             self.deletions_weighted,
-             self.insertions_weighted]
-        )
-
     def _hamming_distance(self) -> Union[str, int]:
         """Compute Hamming distance from C extension module Python-Levensthein."""
         return "Ø" if self.length_char_reference != self.length_char_prediction else hamming(self.reference,
@@ -222,131 +552,259 @@ class Scorer:
 
     def _wer(self) -> float:
         """Compute word error rate (WER)."""
-        return (self.lev_distance_words / self.length_words_reference)
+        return _safe_divide(self.lev_distance_words, self.length_words_reference)
 
     def _wer_hunt(self) -> float:
         """Compute Hunt word error rate that minimize errors of deletions and insertions."""
-        return (sum([
+        return _safe_divide(sum([
             self.word_substs,
             0.5 * self.word_deletions,
             0.5 * self.word_insertions
         ]
-        ) / self.length_words_reference) if (
+        ), self.length_words_reference) if (
                 self.insertion_cost == 1
                 and self.deletion_cost == 1
-                and self.substitution_cost == 1) else (sum(
+                and self.substitution_cost == 1) else _safe_divide(sum(
             [
                 self.word_substs_weighted,
                 0.5 * self.word_deletions_weighted,
                 0.5 * self.word_insertions_weighted
             ]
-        ) / self.length_words_reference)
+        ), self.length_words_reference)
 
     def _cer(self) -> float:
         """Compute character error rate (CER)."""
-        return (self.lev_distance_char / self.length_char_reference)
+        return _safe_divide(self.lev_distance_char, self.length_char_reference)
 
     def _wacc(self) -> float:
         """Compute word accuracy (Wacc)."""
-        return (1 - (self.lev_distance_words / self.length_words_reference))
+        return (1 - _safe_divide(self.lev_distance_words, self.length_words_reference))
 
     # Collection of experimental ASR (Automatic Speech Recognition) metrics #
     def _cip(self) -> float:
         """Compute character information preserved (CIP)."""
         return (float(self.hits) / self.length_char_reference) * (
-                    float(self.hits) / self.length_char_prediction) if self.prediction else 0.0
+                    float(self.hits) / self.length_char_prediction) if self.length_char_reference and self.length_char_prediction else 0.0
 
     def _cil(self) -> float:
         """Compute character information lost (CIL)."""
         return (1 - (float(self.hits) / self.length_char_reference) * (
-                    float(self.hits) / self.length_char_prediction)) if self.prediction else 0.0
+                    float(self.hits) / self.length_char_prediction)) if self.length_char_reference and self.length_char_prediction else 0.0
 
     def _mer(self) -> float:
         """Compute match error rate (MER)."""
-        return float(
+        return _safe_divide(float(
             self.substs
             + self.deletions
-            + self.insertions) \
-            / float(
+            + self.insertions),
+            float(
                 self.hits
                 + self.substs
                 + self.deletions
-                + self.insertions)
-
-    @staticmethod
-    def sentence_blocks(sentence, n=10):
-        s = sentence.split("\n")
-        for i in range(0, len(s), n):
-            yield " ".join(s[i:i + n])
-
-    def _get_operation_counts(self) -> Tuple[
-        int, int, int, int, float, float, float, int, int, int, float, float, float]:
-        """Find sequence of edit operations transforming one string to another.
-        Based on editops function from C extension module python-Levenshtein."""
-
-        # Texts over ~7000/8000 characters can cause a MemoryError with
-        # editops function; the strategy is to tokenize sentences and pass
-        # in editops with a batch process.
-        try:
-            result_editops_char = editops(self.reference, self.prediction)
-            result_editops_word = editops(*_hot_encode(
-                [
-                    self.reference.split(),
-                    self.prediction.split()
-                ]
-            )
-                                          )
-        except MemoryError:
-            result_editops_char = []
-            result_editops_word = []
-
-            for r, p in zip(self.sentence_blocks(self.reference), self.sentence_blocks(self.prediction)):
-                result_editops_char.extend(editops(r, p))
-                result_editops_word.extend(editops(*_hot_encode(
-                    [
-                        r.split(),
-                        p.split()
-                    ]
-                )
-                                                   ))
-
-        def _sum_operations(keyword: str, results: Sequence[Tuple[str, int, int]]) -> int:
-            """Compute a sum of define operations"""
-            total = sum(1 if operations[0] == keyword else 0 for operations in results)
-            return total
-
-        def _sum_operations_weighted(keyword: str, results: Sequence[Tuple[str, int, int]], weight: float) -> float:
-            total = sum(1 * weight if operations[0] == keyword else 0 for operations in results)
-            return total
-
-        substitutions = _sum_operations("replace", result_editops_char)
-        deletions = _sum_operations("delete", result_editops_char)
-        insertions = _sum_operations("insert", result_editops_char)
-
-        substitutions_weighted = _sum_operations_weighted("replace", result_editops_char, weight=self.substitution_cost)
-        deletions_weighted = _sum_operations_weighted("delete", result_editops_char, weight=self.deletion_cost)
-        insertions_weighted = _sum_operations_weighted("insert", result_editops_char, weight=self.insertion_cost)
-
-        word_substitutions = _sum_operations("replace", result_editops_word)
-        word_deletions = _sum_operations("delete", result_editops_word)
-        word_insertions = _sum_operations("insert", result_editops_word)
-
-        word_substitutions_weighted = _sum_operations_weighted("replace", result_editops_word,
-                                                               weight=self.substitution_cost)
-        word_deletions_weighted = _sum_operations_weighted("delete", result_editops_word, weight=self.deletion_cost)
-        word_insertions_weighted = _sum_operations_weighted("insert", result_editops_word, weight=self.insertion_cost)
-
-        hits = self.length_char_reference - (substitutions + deletions)
-        return hits, \
-            substitutions, \
-            deletions, \
-            insertions, \
-            substitutions_weighted, \
-            deletions_weighted, \
-            insertions_weighted, \
-            word_substitutions, \
-            word_deletions, \
-            word_insertions, \
-            word_substitutions_weighted, \
-            word_deletions_weighted, \
-            word_insertions_weighted
\ No newline at end of file
+                + self.insertions))
+
+    def _count_confusions(self, result_editops_char: Sequence[Tuple[str, int, int]]) -> Counter:
+        """Count confusions between characters from the operations of the characters alignment."""
+        reference, prediction = self.reference, self.prediction
+        return Counter(
+            (reference[index_ref] if operation != "insert" else "",
+             prediction[index_pred] if operation != "delete" else "")
+            for operation, index_ref, index_pred in result_editops_char)
+
+
+# Corpus-level scoring #
+
+# Scorer options and words register of the current worker process, set once by `_init_worker`
+_WORKER_OPTIONS = {}
+_WORKER_VOCABULARY = None
+
+# Number of words beyond which a words register shared by pairs is cleared : ids only need to be
+# consistent inside a pair, so memory of a corpus stays bounded whatever its vocabulary (eg. OCR noise)
+_MAX_VOCABULARY_SIZE = 1 << 16
+
+
+def _init_worker(options: dict) -> None:
+    """Store Scorer options and create the words register of a worker process of the pool."""
+    global _WORKER_OPTIONS, _WORKER_VOCABULARY
+    _WORKER_OPTIONS = options
+    _WORKER_VOCABULARY = _WordVocabulary()
+
+
+def _score_pair(pair: Tuple[str, str],
+                options: Optional[dict] = None,
+                vocabulary: Optional[_WordVocabulary] = None) -> Tuple[dict, Optional[Tuple[Union[int, float, str], ...]]]:
+    """Score one (reference, prediction) pair with the options of the worker (or given options)."""
+    if options is None:
+        options, vocabulary = _WORKER_OPTIONS, _WORKER_VOCABULARY
+    scorer = Scorer(pair[0], pair[1], vocabulary=vocabulary, **options)
+    scored = scorer.board, scorer._counts()
+    if vocabulary is not None and len(vocabulary) > _MAX_VOCABULARY_SIZE:
+        vocabulary.clear()
+    return scored
+
+
+def _empty_totals() -> List[Union[int, float, str, None]]:
+    """Create corpus totals before any pair is added."""
+    return [None if field == "confusions" else 0 for field in _COUNT_FIELDS]
+
+
+def _add_counts(totals: List[Union[int, float, str, Counter]], counts: Sequence[Union[int, float, str, Counter]]) -> None:
+    """Add the counts of one pair to corpus totals (in place)."""
+    for index, value in enumerate(counts):
+        if _COUNT_FIELDS[index] == "hamming":
+            # Hamming distance is only defined if it is defined for every pair
+            totals[index] = "Ø" if "Ø" in (totals[index], value) else totals[index] + value
+        elif _COUNT_FIELDS[index] == "confusions":
+            if value is not None:
+                # merged in a Counter of totals (counts of a pair may be shared with a cache)
+                if totals[index] is None:
+                    totals[index] = Counter()
+                totals[index].update(value)
+        else:
+            totals[index] += value
+
+
+def _copy_counts(counts: Sequence[Union[int, float, str, Counter]]) -> Tuple[Union[int, float, str, Counter], ...]:
+    """Copy counts of a pair with their own Counter of confusions, so a board changed by the caller
+    does not change counts kept in a cache (and the reverse)."""
+    if counts[-1] is None:
+        return tuple(counts)
+    return tuple(counts[:-1]) + (Counter(counts[-1]),)
+
+
+def _score_window(chunk: List[Tuple[str, str]],
+                  pool: Optional[Pool],
+                  chunk_size: int,
+                  options: dict,
+                  cache: Optional[AlignmentCache],
+                  vocabulary: _WordVocabulary) -> List[Tuple[dict, Optional[Tuple[Union[int, float, str], ...]]]]:
+    """Score a window of pairs, only pairs missing from cache are aligned."""
+    def _score(pairs):
+        if pool is None:
+            return [_score_pair(pair, options, vocabulary) for pair in pairs]
+        return pool.map(_score_pair, pairs, chunksize=chunk_size)
+
+    if cache is None:
+        return _score(chunk)
+
+    costs = {name: options[name]
+             for name in ("insertion_cost", "deletion_cost", "substitution_cost", "confusions", "split_punctuation")
+             if name in options}
+    keys = [cache.key(reference, prediction, **costs) for reference, prediction in chunk]
+    results = [None] * len(chunk)
+    missing = []
+    for index, key in enumerate(keys):
+        counts = cache.get(key)
+        if counts is None:
+            missing.append(index)
+        else:
+            scorer = Scorer._from_counts(counts, **options)
+            results[index] = (scorer.board, scorer._counts())
+    for index, (board, counts) in zip(missing, _score([chunk[index] for index in missing])):
+        results[index] = (board, counts)
+        if counts is not None:
+            cache.put(keys[index], _copy_counts(counts))
+    return results
+
+
+def _iter_scored(pairs: Iterable[Tuple[str, str]],
+                 workers: int,
+                 chunk_size: int,
+                 options: dict,
+                 cache: Optional[AlignmentCache] = None) -> Iterator[Tuple[dict, Optional[Tuple[Union[int, float, str], ...]]]]:
+    """Lazily score pairs (in input order), a window of pairs at a time."""
+    pairs = iter(pairs)
+    # words are interned in a register shared by pairs (in each worker if a pool is used),
+    # cleared beyond `_MAX_VOCABULARY_SIZE` words
+    vocabulary = _WordVocabulary()
+
+    def _windows(pool, window):
+        while True:
+            chunk = list(islice(pairs, window))
+            if not chunk:
+                break
+            yield from _score_window(chunk, pool, chunk_size, options, cache, vocabulary)
+
+    if workers > 1:
+        with Pool(workers, initializer=_init_worker, initargs=(options,)) as pool:
+            yield from _windows(pool, chunk_size * workers)
+    else:
+        yield from _windows(None, chunk_size)
+
+
+def _score_corpus(pairs: Iterable[Tuple[str, str]],
+                  workers: int = 1,
+                  chunk_size: int = 256,
+                  keep_boards: bool = True,
+                  cache: Optional[AlignmentCache] = None,
+                  collector: Optional[ScoreCollector] = None,
+                  **options) -> Tuple[List[dict], Scorer]:
+    """Score a corpus of pairs and return boards of each pair and a :class: `Scorer` of the corpus."""
+    boards = []
+    totals = _empty_totals()
+    above_threshold = 0
+
+    for board, counts in _iter_scored(pairs, workers, chunk_size, options, cache):
+        if keep_boards:
+            boards.append(board)
+        if collector is not None:
+            collector._add(counts, board["Length_reference"], board["Length_prediction"])
+        if counts is None:
+            above_threshold += 1
+        else:
+            _add_counts(totals, counts)
+
+    corpus = Scorer._from_totals(totals, **options)
+    if options.get("max_cer") is not None or options.get("max_distance") is not None:
+        corpus.board["pairs_above_threshold"] = above_threshold
+    return boards, corpus
+
+
+def score_corpus(pairs: Iterable[Tuple[str, str]],
+                 workers: int = 1,
+                 chunk_size: int = 256,
+                 keep_boards: bool = True,
+                 cache: Optional[AlignmentCache] = None,
+                 collector: Optional[ScoreCollector] = None,
+                 **options) -> Tuple[List[dict], dict]:
+    """Score a corpus of (reference, prediction) pairs, optionally over a pool of processes.
+
+    Corpus metrics are micro-averaged : operations and lengths are summed over all pairs
+    before computing rates (eg. corpus CER is the sum of distances divided by the sum of
+    reference lengths), not averaged from the rates of each pair. Totals are accumulated
+    incrementally, so a generator of pairs (eg. lines of huge files) is scored with constant memory
+    if `keep_boards` is `False`.
+
+    :Example:
+
+    >>> boards, corpus = score_corpus([("le chat", "le chta"), ("un chien", "un chien")])
+    >>> corpus["levensthein_distance_char"]
+    2
+
+    :param pairs: iterable of (reference, prediction) strings, consumed lazily by windows
+    :type pairs: Iterable[Tuple[str, str]]
+    :param workers: number of processes used to score pairs. Defaults to 1 (no pool).
+    :type workers: int
+    :param chunk_size: number of pairs sent at once to a worker. Defaults to 256.
+    :type chunk_size: int
+    :param keep_boards: `True` to return the board of each pair else only the corpus board is kept. Defaults to True.
+    :type keep_boards: bool
+    :param cache: cache of counts of pairs already aligned, only pairs not in cache are aligned
+    (see :class: `AlignmentCache`). Defaults to None.
+    :type cache: AlignmentCache, optional
+    :param collector: columnar store where counts of each pair are added, eg. to export
+    scores of millions of pairs in bulk with `keep_boards=False` (see :class: `ScoreCollector`). Defaults to None.
+    :type collector: ScoreCollector, optional
+    :param options: keyword arguments passed to each :class: `Scorer` (costs, display and triage options),
+    pairs above the triage threshold are left out of corpus totals and counted in "pairs_above_threshold"
+    :return: boards of each pair (in input order) and the board of the corpus
+    :rtype: tuple
+    """
+    boards, corpus = _score_corpus(pairs,
+                                   workers=workers,
+                                   chunk_size=chunk_size,
+                                   keep_boards=keep_boards,
+                                   cache=cache,
+                                   collector=collector,
+                                   **options)
+    return boards, corpus.board
@@ -1,43 +1,100 @@
 """Python's bridges for C shared metrics functions
+
+Build the shared library in place (it is not shipped in wheels) with :
+    python setup.py build_metrics_lib
+
+If the library is missing (or built for another platform), bindings are None
+and batch metrics fall back to NumPy.
 """
 import os
 from ctypes import *
+from typing import Dict, Optional
+
+import numpy as np
 
 PATH = os.path.dirname(os.path.abspath(__file__))
-METRICS_FUNCTIONS = CDLL(os.path.join(PATH, "metrics_lib.so"))
+
+
+def _load_library(path: str = os.path.join(PATH, "metrics_lib.so")) -> Optional[CDLL]:
+    """Load the C shared library of metrics, None if it is not available."""
+    try:
+        return CDLL(path)
+    except OSError:
+        return None
+
+
+METRICS_FUNCTIONS = _load_library()
+
+
+def _bind(name: str, argtypes: list, restype) -> Optional[CDLL._FuncPtr]:
+    """Bind a function of the shared library, None if the library or the function is not available."""
+    function = getattr(METRICS_FUNCTIONS, name, None)
+    if function is not None:
+        function.argtypes = argtypes
+        function.restype = restype
+    return function
 
 
 # HTR/OCR Metrics
 
 
-WER = METRICS_FUNCTIONS.WordErrorRate
-WER.argtypes = [c_int, c_int]
-WER.restype = c_float
+WER = _bind("WordErrorRate", [c_int, c_int], c_float)
 
-CER = METRICS_FUNCTIONS.CharacterErrorRate
-CER.argtypes = [c_int, c_int]
-CER.restype = c_float
+CER = _bind("CharacterErrorRate", [c_int, c_int], c_float)
 
-WACC = METRICS_FUNCTIONS.WordAccuracy
-WACC.argtypes = [c_float]
-WACC.restype = c_float
+WACC = _bind("WordAccuracy", [c_float], c_float)
 
-WERHUNT = METRICS_FUNCTIONS.WordErrorRateHuntStyle
-WERHUNT.argtypes = [c_float, c_float]
-WERHUNT.restype = c_float
+WERHUNT = _bind("WordErrorRateHuntStyle", [c_float, c_float], c_float)
 
 
 # ASR Metrics
 
-CIP = METRICS_FUNCTIONS.CharacterInformationPreserve
-CIP.argtypes = [c_int, c_int, c_int]
-CIP.restype = c_float
+CIP = _bind("CharacterInformationPreserve", [c_int, c_int, c_int], c_float)
+
+CIL = _bind("CharacterInformationLost", [c_float], c_float)
+
+
+MER = _bind("MatchErrorRate", [c_int, c_int], c_float)
+
+
+# Batch kernels
+
+# Columns of counts read by the batch kernel, in the order of its arguments
+BATCH_COUNTS = (
+    "length_char_reference",
+    "length_char_prediction",
+    "length_words_reference",
+    "hits",
+    "substs",
+    "deletions",
+    "insertions",
+    "word_substs_weighted",
+    "word_deletions_weighted",
+    "word_insertions_weighted",
+    "lev_distance_char",
+    "lev_distance_words",
+)
+# Columns of metrics filled by the batch kernel, in the order of its arguments
+BATCH_METRICS = ("wer", "wer_hunt", "cer", "wacc", "cip", "cil", "mer")
+
+_DOUBLE_ARRAY = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
 
-CIL = METRICS_FUNCTIONS.CharacterInformationLost
-CIL.argtypes = [c_float]
-CIL.restype = c_float
+METRICS_BATCH = _bind("ComputeMetricsBatch",
+                      [c_size_t]
+                      + [_DOUBLE_ARRAY] * len(BATCH_COUNTS)
+                      + [np.ctypeslib.ndpointer(dtype=np.uint8, flags="C_CONTIGUOUS")]
+                      + [_DOUBLE_ARRAY] * len(BATCH_METRICS),
+                      None)
 
 
-MER = METRICS_FUNCTIONS.MatchErrorRate
-MER.argtypes = [c_int, c_int]
-MER.restype = c_float
+def batch_metrics(columns: Dict[str, np.ndarray]) -> Optional[Dict[str, np.ndarray]]:
+    """Compute metrics of all pairs in one native call from columns of counts
+    (`BATCH_COUNTS` and "above_threshold"), None if the batch kernel is not available."""
+    if METRICS_BATCH is None:
+        return None
+    size = len(columns["length_char_reference"])
+    counts = [np.ascontiguousarray(columns[name], dtype=np.float64) for name in BATCH_COUNTS]
+    above_threshold = np.ascontiguousarray(columns["above_threshold"], dtype=np.uint8)
+    metrics = {name: np.empty(size, dtype=np.float64) for name in BATCH_METRICS}
+    METRICS_BATCH(size, *counts, above_threshold, *(metrics[name] for name in BATCH_METRICS))
+    return metrics
@@ -1,5 +1,6 @@
 #include <stdio.h>
 #include <stdlib.h>
+#include <math.h>
 #include "metrics_lib.h"
 
 /* HTR OCR metrics functions */
@@ -41,3 +42,65 @@ float MatchErrorRate(int hits, int lev_distance_char)
 {
     return (float)lev_distance_char/((float)hits+(float)lev_distance_char);
 };
+
+
+/* Batch kernels : metrics of `size` pairs from contiguous arrays of counts */
+
+static double SafeDivide(double numerator, double denominator)
+{
+    if (denominator == 0.0)
+        return numerator != 0.0 ? INFINITY : 0.0;
+    return numerator / denominator;
+};
+
+void ComputeMetricsBatch(size_t size,
+                         const double *length_char_reference,
+                         const double *length_char_prediction,
+                         const double *length_words_reference,
+                         const double *hits,
+                         const double *substs,
+                         const double *deletions,
+                         const double *insertions,
+                         const double *word_substs_weighted,
+                         const double *word_deletions_weighted,
+                         const double *word_insertions_weighted,
+                         const double *lev_distance_char,
+                         const double *lev_distance_words,
+                         const unsigned char *above_threshold,
+                         double *wer,
+                         double *wer_hunt,
+                         double *cer,
+                         double *wacc,
+                         double *cip,
+                         double *cil,
+                         double *mer)
+{
+    size_t i;
+    double errors, preserved;
+    for (i = 0; i < size; i++)
+    {
+        if (above_threshold != NULL && above_threshold[i])
+        {
+            wer[i] = wer_hunt[i] = cer[i] = wacc[i] = cip[i] = cil[i] = mer[i] = NAN;
+            continue;
+        }
+        wer[i] = SafeDivide(lev_distance_words[i], length_words_reference[i]);
+        wer_hunt[i] = SafeDivide(word_substs_weighted[i]
+                                 + 0.5 * word_deletions_weighted[i]
+                                 + 0.5 * word_insertions_weighted[i], length_words_reference[i]);
+        cer[i] = SafeDivide(lev_distance_char[i], length_char_reference[i]);
+        wacc[i] = 1.0 - wer[i];
+        if (length_char_reference[i] != 0.0 && length_char_prediction[i] != 0.0)
+        {
+            preserved = (hits[i] / length_char_reference[i]) * (hits[i] / length_char_prediction[i]);
+            cip[i] = preserved;
+            cil[i] = 1.0 - preserved;
+        }
+        else
+        {
+            cip[i] = cil[i] = 0.0;
+        }
+        errors = substs[i] + deletions[i] + insertions[i];
+        mer[i] = SafeDivide(errors, hits[i] + errors);
+    }
+};
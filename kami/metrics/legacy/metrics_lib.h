@@ -1,7 +1,32 @@
+#include <stddef.h>
+
 float WordErrorRate(int lev_distance_word, int total_reference_word);
 float CharacterErrorRate(int lev_distance_char, int total_reference_char);
 float WordErrorRateHuntStyle(float total_w, float total_reference_word);
 float WordAccuracy(float wer);
 float CharacterInformationPreserve(int hits, int total_reference_char, int total_prediction_char);
 float CharacterInformationLost(float cip);
-float MatchErrorRate(int hits, int lev_distance_char);
\ No newline at end of file
+float MatchErrorRate(int hits, int lev_distance_char);
+
+/* Batch kernels */
+void ComputeMetricsBatch(size_t size,
+                         const double *length_char_reference,
+                         const double *length_char_prediction,
+                         const double *length_words_reference,
+                         const double *hits,
+                         const double *substs,
+                         const double *deletions,
+                         const double *insertions,
+                         const double *word_substs_weighted,
+                         const double *word_deletions_weighted,
+                         const double *word_insertions_weighted,
+                         const double *lev_distance_char,
+                         const double *lev_distance_words,
+                         const unsigned char *above_threshold,
+                         double *wer,
+                         double *wer_hunt,
+                         double *cer,
+                         double *wacc,
+                         double *cip,
+                         double *cil,
+                         double *mer);
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Authors : Lucas Terriel <lucas.terriel@inria.fr>
+# Licence : MIT
+"""
+    The ``pairing`` module to align lines of ground truth and prediction
+    ====================================================================
+"""
+
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+from Levenshtein import distance
+
+__all__ = [
+    "pair_lines",
+    "match_lines",
+]
+
+
+def _grams(line: str, size: int) -> FrozenSet[str]:
+    """Set of n-grams of a line (the line itself if it is shorter than n-grams)."""
+    return frozenset(line[index:index + size] for index in range(max(len(line) - size + 1, 1)))
+
+
+def pair_lines(reference_lines: Iterable[str],
+               prediction_lines: Iterable[str],
+               max_merge: int = 2,
+               band: int = 16,
+               gram_size: int = 2) -> List[Tuple[str, str]]:
+    """Pair lines of ground truth and prediction before scoring, when the numbers of lines differ
+    (eg. lines merged, split or dropped by the recognition).
+
+    Lines are aligned in order with a dynamic programming over lines : a reference line is paired with
+    a prediction line, left out (paired with "") or up to `max_merge` consecutive lines of one side are
+    joined (with a space) and paired with one line of the other side. The cost of a pairing is the edit
+    distance of its strings, so pairs minimize the total distance. The table is pruned to a band around
+    lines at the same offset of characters, and the distance of a pairing is only computed (with a cut-off) if cheap lower bounds
+    (difference of lengths, n-grams not shared) do not already exceed the best cost of the cell,
+    so the pairing scales close to linearly with the number of lines.
+
+    :Example:
+
+    >>> pair_lines(["le chat", "dort ici", "la souris"], ["le chat dort ici", "la sourit"])
+    [('le chat dort ici', 'le chat dort ici'), ('la souris', 'la sourit')]
+
+    :param reference_lines: lines of the ground truth
+    :type reference_lines: Iterable[str]
+    :param prediction_lines: lines of the prediction
+    :type prediction_lines: Iterable[str]
+    :param max_merge: maximum number of lines joined in a pair. Defaults to 2.
+    :type max_merge: int
+    :param band: half-width (in lines) of the band of the table kept, it is widened if no path is found. Defaults to 16.
+    :type band: int
+    :param gram_size: size of n-grams of the lower bound. Defaults to 2.
+    :type gram_size: int
+    :return: (reference, prediction) pairs in order, to score with :func: `score_corpus`
+    :rtype: list
+    """
+    references = list(reference_lines)
+    predictions = list(prediction_lines)
+    total_references, total_predictions = len(references), len(predictions)
+    grams_references = [_grams(line, gram_size) for line in references]
+    grams_predictions = [_grams(line, gram_size) for line in predictions]
+    # the band follows offsets of characters (rather than of lines), so it stays close to
+    # the best path whatever the lines merged or left out
+    offsets_references = list(accumulate((len(line) + 1 for line in references), initial=0))
+    offsets_predictions = list(accumulate((len(line) + 1 for line in predictions), initial=0))
+    scale = offsets_predictions[-1] / offsets_references[-1] if total_references else 0.0
+
+    def _columns(row: int) -> range:
+        center = bisect_left(offsets_predictions, offsets_references[row] * scale)
+        return range(max(center - band, 0), min(center + band, total_predictions) + 1)
+
+    # costs of cells of the band and the previous cell of each (backtrace)
+    costs: Dict[Tuple[int, int], int] = {}
+    previous: Dict[Tuple[int, int], Tuple[int, int]] = {}
+
+    def _relax(best: Optional[Tuple[int, Tuple[int, int]]],
+               start: Tuple[int, int],
+               lower_bound: int,
+               strings: Optional[Tuple[str, str]] = None) -> Optional[Tuple[int, Tuple[int, int]]]:
+        """Return the best (cost, previous cell) of a cell, updated with a pairing from cell `start`."""
+        start_cost = costs.get(start)
+        if start_cost is None or (best is not None and start_cost + lower_bound >= best[0]):
+            return best
+        cost = lower_bound
+        if strings is not None:
+            cut_off = None if best is None else best[0] - start_cost - 1
+            cost = distance(strings[0], strings[1], score_cutoff=cut_off)
+        if best is None or start_cost + cost < best[0]:
+            return start_cost + cost, start
+        return best
+
+    for row in range(total_references + 1):
+        for column in _columns(row):
+            if not row and not column:
+                costs[0, 0] = 0
+                continue
+            best = None
+            if row and column:
+                # one line with one line
+                reference, prediction = references[row - 1], predictions[column - 1]
+                grams_reference, grams_prediction = grams_references[row - 1], grams_predictions[column - 1]
+                lower_bound = max(abs(len(reference) - len(prediction)),
+                                  -(-len(grams_reference - grams_prediction) // gram_size),
+                                  -(-len(grams_prediction - grams_reference) // gram_size))
+                best = _relax(best, (row - 1, column - 1), lower_bound, (reference, prediction))
+            if row:
+                # reference line left out
+                best = _relax(best, (row - 1, column), len(references[row - 1]))
+            if column:
+                # prediction line left out
+                best = _relax(best, (row, column - 1), len(predictions[column - 1]))
+            for merged in range(2, max_merge + 1):
+                # consecutive lines joined
+                if row >= merged and column:
+                    reference = " ".join(references[row - merged:row])
+                    prediction = predictions[column - 1]
+                    best = _relax(best, (row - merged, column - 1),
+                                  abs(len(reference) - len(prediction)), (reference, prediction))
+                if column >= merged and row:
+                    reference = references[row - 1]
+                    prediction = " ".join(predictions[column - merged:column])
+                    best = _relax(best, (row - 1, column - merged),
+                                  abs(len(reference) - len(prediction)), (reference, prediction))
+            if best is not None:
+                costs[row, column], previous[row, column] = best
+
+    if (total_references, total_predictions) not in costs:
+        # lines too unbalanced for the band (eg. a very long line), pair them again with a wider band
+        return pair_lines(references, predictions, max_merge, band * 2, gram_size)
+
+    pairs = []
+    row, column = total_references, total_predictions
+    while row or column:
+        start_row, start_column = previous[row, column]
+        pairs.append((" ".join(references[start_row:row]), " ".join(predictions[start_column:column])))
+        row, column = start_row, start_column
+    pairs.reverse()
+    return pairs
+
+
+def match_lines(reference_lines: Iterable[str],
+                prediction_lines: Iterable[str],
+                candidates: int = 5,
+                gram_size: int = 3) -> List[Tuple[str, str]]:
+    """Match lines of ground truth and prediction whatever their order (eg. reading order errors
+    on multi-column pages), each line is matched at most once.
+
+    An inverted index of the n-grams of reference lines gives, for each prediction line, the reference lines
+    sharing the most n-grams with it. The edit distance is only computed for these `candidates` lines instead
+    of all reference lines, then matches are chosen from the smallest distance to the largest. A match is kept
+    only if it is cheaper than leaving both lines out.
+
+    :Example:
+
+    >>> match_lines(["le chat dort", "la souris mange"], ["la souris mange", "le chat dors", "en trop"])
+    [('le chat dort', 'le chat dors'), ('la souris mange', 'la souris mange'), ('', 'en trop')]
+
+    :param reference_lines: lines of the ground truth
+    :type reference_lines: Iterable[str]
+    :param prediction_lines: lines of the prediction
+    :type prediction_lines: Iterable[str]
+    :param candidates: number of reference lines compared with each prediction line. Defaults to 5.
+    :type candidates: int
+    :param gram_size: size of n-grams of the index. Defaults to 3.
+    :type gram_size: int
+    :return: (reference, prediction) pairs in the order of reference lines, then prediction lines not matched
+    paired with "", to score with :func: `score_corpus`
+    :rtype: list
+    """
+    references = list(reference_lines)
+    predictions = list(prediction_lines)
+
+    postings: Dict[str, List[int]] = {}
+    for number, line in enumerate(references):
+        for gram in _grams(line, gram_size):
+            postings.setdefault(gram, []).append(number)
+    index = {gram: np.array(numbers, dtype=np.intp) for gram, numbers in postings.items()}
+
+    matches = []
+    for number_prediction, prediction in enumerate(predictions):
+        found = [index[gram] for gram in _grams(prediction, gram_size) if gram in index]
+        if not found:
+            continue
+        # number of n-grams shared with each reference line
+        shared = np.bincount(np.concatenate(found), minlength=len(references))
+        best = np.flatnonzero(shared)
+        if len(best) > candidates:
+            best = best[np.argpartition(-shared[best], candidates - 1)[:candidates]]
+        for number_reference in best.tolist():
+            reference = references[number_reference]
+            # leaving both lines out costs the sum of their lengths
+            cost = distance(reference, prediction, score_cutoff=len(reference) + len(prediction) - 1)
+            if cost < len(reference) + len(prediction):
+                matches.append((cost, number_reference, number_prediction))
+
+    matched_references: Dict[int, int] = {}
+    matched_predictions = set()
+    for _, number_reference, number_prediction in sorted(matches):
+        if number_reference not in matched_references and number_prediction not in matched_predictions:
+            matched_references[number_reference] = number_prediction
+            matched_predictions.add(number_prediction)
+
+    pairs = [(reference, predictions[matched_references[number]] if number in matched_references else "")
+             for number, reference in enumerate(references)]
+    pairs.extend(("", prediction) for number, prediction in enumerate(predictions)
+                 if number not in matched_predictions)
+    return pairs
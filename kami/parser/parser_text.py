@@ -7,48 +7,190 @@
 
 """
 
+import mmap
 import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+
 from kami.kamutils._utils import (_report_log)
 
 __all__ = [
     "_TextParser"
 ]
 
+# Number of bytes of a file scanned at once to find its lines, bounds memory of the scan
+_BLOCK_SIZE = 1 << 20
+
+
+def _ascii_content(block: np.ndarray) -> np.ndarray:
+    """Mask of ASCII bytes that are not whitespace for `str.strip` (content of a line)."""
+    return ((block > 32) & (block < 128)) | (block < 9) | ((block > 13) & (block < 28))
+
+
+def _next_break(buffer: Union[bytes, mmap.mmap], start: int, stop: int, backward: bool = False) -> int:
+    """Offset of the first (or with `backward`, the last) line break ("\\n" or "\\r") of a buffer
+    in [start, stop), -1 if there is none."""
+    if backward:
+        return max(buffer.rfind(b"\n", start, stop), buffer.rfind(b"\r", start, stop))
+    found = [offset for offset in (buffer.find(b"\n", start, stop), buffer.find(b"\r", start, stop)) if offset != -1]
+    return min(found) if found else -1
+
+
+def _scan_blocks(buffer: Union[bytes, mmap.mmap]) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray]]:
+    """Find the non-empty lines of a UTF-8 buffer (eg. a memory mapped file), a block of whole lines at a time.
+    Yield the offset of each block, its bytes and the start and end offsets (line break excluded)
+    of its non-empty lines in the block.
+
+    Line breaks are "\\n", "\\r\\n" or "\\r" (as files read in text mode) : each "\\r" or "\\n" ends
+    a line, so "\\r\\n" leaves an empty line between them, and empty lines are left out.
+    A line is empty if it only has whitespace (as `str.strip`) : lines are tested on bytes
+    in a vectorized way, only lines of non-ASCII characters without other content are decoded.
+    """
+    size = len(buffer)
+    position = 0
+    while position < size:
+        stop = min(position + _BLOCK_SIZE, size)
+        if stop < size:
+            # blocks end after a line break (or after a line longer than a block)
+            cut = _next_break(buffer, position, stop, backward=True)
+            if cut == -1:
+                cut = _next_break(buffer, stop, size)
+            stop = cut + 1 if cut != -1 else size
+        block = np.frombuffer(buffer[position:stop], dtype=np.uint8)
+        ends = np.flatnonzero((block == 10) | (block == 13))
+        if block[-1] not in (10, 13):
+            ends = np.append(ends, len(block))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        # a segment of `reduceat` runs from a start to the next one, line break included (not content)
+        kept = np.logical_or.reduceat(_ascii_content(block), starts)
+        non_ascii = np.logical_or.reduceat(block >= 128, starts)
+        for index in np.flatnonzero(~kept & non_ascii).tolist():
+            # eg. a line of no-break spaces
+            kept[index] = block[starts[index]:ends[index]].tobytes().decode("utf8").strip() != ""
+        yield position, block, starts[kept], ends[kept]
+        position = stop
+
+
+def _scan_lines(buffer: Union[bytes, mmap.mmap]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Find the start and end offsets (line break excluded) of the non-empty lines of a buffer in it,
+    a block of lines at a time (see `_scan_blocks`)."""
+    for position, _, starts, ends in _scan_blocks(buffer):
+        yield starts + position, ends + position
+
+
 class _TextParser:
     """A very simple Text Parser for KaMI.
 
+    Files are memory mapped : the offsets of non-empty lines are found with a single scan
+    and lines are decoded on demand, so the content of a file is only held in memory once
+    (by :ivar: `text`), or not at all when iterating over `lines()`.
+
     Parameters
     ----------
         :param source:  path to source file or plain text
         :type source: str
+        :param lazy:  `True` to not scan the source file, lines are then read
+        on demand with `lines()`. Defaults to False.
+        :type lazy: bool
 
     Attributes
     ----------
         :ivar file_name: source text file.
         :param file_name: str
-        :ivar text: text content from source file.
+        :ivar text: text content from source file (non-empty lines, each one followed by "\\n"),
+        decoded when first accessed.
         :param text: str
     """
-    def _get_text(self) -> None:
-        """Open a TXT file and load its content"""
-        if self.file_name:
-            with open(self.file_name, "r", encoding="utf8") as fh:
-                content = fh.read()
-                content = ''.join([line + "\n" for line in content.split('\n') if line.strip() != ''])
-        self.text = content
-
-    def __init__(self, source):
+    def __init__(self, source, lazy: bool = False):
         self.file_name = None
-        self.text = None
+        self._text = None
+        self._offsets = None
         if isinstance(source, str) and os.path.isfile(source):
             self.file_name = source
-            self._get_text()
+            if not lazy:
+                self._get_offsets()
         elif isinstance(source, str):
             if os.sep in source:
                 pass
                 #_report_log("Provided input is considered as plain text. If you intended it to be a handled "+
                 #            "as a path, you may need to make sure it is correct.", "W")
-            self.text = source
+            self._text = source
         else:
             _report_log("TextParser can't proceed. Verify your input: it must be a string. "+
                         "Created an empty object.", "W")
+
+    @contextmanager
+    def _mapped(self) -> Iterator[Union[bytes, mmap.mmap]]:
+        """Map the source file in memory (read only)"""
+        with open(self.file_name, "rb") as fh:
+            if os.fstat(fh.fileno()).st_size == 0:
+                # an empty file can not be mapped
+                yield b""
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield buffer
+
+    def _get_offsets(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return start and end offsets (in bytes) of the non-empty lines of the source file, scanned once"""
+        if self._offsets is None:
+            with self._mapped() as buffer:
+                blocks = list(_scan_lines(buffer))
+            self._offsets = (np.concatenate([starts for starts, _ in blocks] or [np.empty(0, dtype=np.intp)]),
+                             np.concatenate([ends for _, ends in blocks] or [np.empty(0, dtype=np.intp)]))
+        return self._offsets
+
+    def _get_text(self) -> str:
+        """Decode the non-empty lines of the source file in a single text"""
+        starts, ends = self._get_offsets()
+        if not len(starts):
+            return ""
+        with self._mapped() as buffer:
+            if (starts[0] == 0 and np.array_equal(starts[1:], ends[:-1] + 1) and ends[-1] >= len(buffer) - 1
+                    and buffer.find(b"\r") == -1):
+                # no line left out and only "\n" line breaks : the file is decoded as is, without an intermediate copy
+                with memoryview(buffer) as view:
+                    text = str(view, "utf8")
+                return text if text.endswith("\n") else text + "\n"
+            # lines are copied by blocks in a single buffer, each one followed by "\n", then decoded once
+            content = bytearray(int((ends - starts).sum()) + len(starts))
+            output = np.frombuffer(content, dtype=np.uint8)
+            position = 0
+            for _, block, starts, ends in _scan_blocks(buffer):
+                if not len(starts):
+                    continue
+                # each line is taken with the byte after it (its line break, or a padding byte after the last line)
+                block = np.append(block, np.uint8(10))
+                bounds = np.zeros(len(block) + 1, dtype=np.int8)
+                bounds[starts] = 1
+                bounds[ends + 1] -= 1
+                lines = block[np.cumsum(bounds[:-1], dtype=np.int8).view(bool)]
+                lines[np.cumsum(ends - starts + 1) - 1] = 10
+                output[position:position + len(lines)] = lines
+                position += len(lines)
+            del output
+        return content.decode("utf8")
+
+    @property
+    def text(self) -> Optional[str]:
+        if self._text is None and self.file_name:
+            self._text = self._get_text()
+        return self._text
+
+    def __len__(self) -> int:
+        """Number of non-empty lines of the source"""
+        if self.file_name and self._text is None:
+            return len(self._get_offsets()[0])
+        return sum(1 for _ in self.lines())
+
+    def lines(self) -> Iterator[str]:
+        """Iterate over non-empty lines (without line break) of the source, one line in memory at a time"""
+        if self._text is not None:
+            yield from (line for line in self._text.split('\n') if line.strip() != '')
+        elif self.file_name:
+            with self._mapped() as buffer:
+                blocks = [self._offsets] if self._offsets is not None else _scan_lines(buffer)
+                for starts, ends in blocks:
+                    for start, end in zip(starts.tolist(), ends.tolist()):
+                        yield buffer[start:end].decode("utf8")
@@ -10,14 +10,21 @@
 
 import re
 import string
+from array import array
+from collections import deque
+from multiprocessing import Pool
 from typing import (Union,
+                    Iterable,
+                    Iterator,
                     List,
                     Mapping,
+                    Tuple,
                     TypeVar,
                     Optional)
 
 import unidecode
 
+from kami.kamutils._tokenizer import _Tokenizer
 from kami.kamutils._utils import _timing
 
 __all__ = [
@@ -47,10 +54,112 @@ TSubRegex = TypeVar('TSubRegex', bound='SubRegex')
 TToLowerCase = TypeVar('TToLowerCase', bound='ToLowerCase')
 TToUpperCase = TypeVar('TToUpperCase', bound='ToUpperCase')
 
+# Patterns compiled once
+_DIGITS_PATTERN = re.compile(r"\d+")
+_RUNS_PATTERNS = (("<<", re.compile(r'<{2,}')),
+                  (">>", re.compile(r'>{2,}')),
+                  ("--", re.compile(r'-{2,}')))
+_BACKREFERENCE_PATTERN = re.compile(r"\\[1-9]")
+# Literal patterns, optionally between word boundaries (eg. "\bvn\b"), merged in a trie by `SubRegex`
+_LITERAL_RULE_PATTERN = re.compile(r"(\\b)?([^\\.^$*+?{}\[\]|()]+)(\\b)?")
+# Lowercase of a capital sigma depends on its position in word (σ or final ς)
+_CAPITAL_SIGMA = "\u03a3"
+
+# Maximum number of code points kept in the tables of diacritics removal and of fused transforms
+_MAX_UNIDECODE_TABLE = 1 << 16
+# Mark after the replacement of each character changed by diacritics removal, to count them
+_CHANGED_MARK = "\x00"
+
+
+# Minimum number of lines of a list processed by a pool of processes, smaller lists are processed
+# serially as starting workers costs more than it saves
+_PARALLEL_MIN_LINES = 10000
+
+# Transform of the current worker process, set once by `_init_worker`
+_WORKER_TRANSFORM = None
+
+
+def _init_worker(transform: "_AbstractTransform") -> None:
+    """Store the transform of a worker process of the pool (sent once to each worker)."""
+    global _WORKER_TRANSFORM
+    _WORKER_TRANSFORM = transform
+
+
+def _process_chunk(chunk: List[str]) -> List[str]:
+    """Transform a chunk of lines with the transform of the worker."""
+    process_string = _WORKER_TRANSFORM.process_string
+    return [process_string(sequence) for sequence in chunk]
+
+
+def _process_parallel(transform: "_AbstractTransform",
+                      group: List[str],
+                      workers: int,
+                      chunk_size: int) -> Optional[List[str]]:
+    """Transform a list of lines by chunks over a pool of processes, in order of the list,
+    None if the list is too small to be worth a pool."""
+    if workers <= 1 or len(group) < _PARALLEL_MIN_LINES:
+        return None
+    chunks = [group[start:start + chunk_size] for start in range(0, len(group), chunk_size)]
+    with Pool(workers, initializer=_init_worker, initargs=(transform,)) as pool:
+        return [sequence for chunk in pool.map(_process_chunk, chunks) for sequence in chunk]
+
+
+def _split_line_ending(line: str) -> Tuple[str, str]:
+    """Split a line (eg. read from a file) into its content and its line ending ("\\n", "\\r\\n" or "")."""
+    if line.endswith("\n"):
+        if line.endswith("\r\n"):
+            return line[:-2], "\r\n"
+        return line[:-1], "\n"
+    return line, ""
+
+
+class _UnidecodeTable(dict):
+    """A table (for `str.translate`) of code points to their ASCII replacement by unidecode,
+    filled lazily when a character is first met. Beyond `_MAX_UNIDECODE_TABLE` code points
+    (eg. pages of CJK characters), replacements are computed but no longer kept.
+    """
+    def _replace(self, character: str) -> Optional[str]:
+        return unidecode.unidecode(character)
+
+    def __missing__(self, codepoint: int) -> Optional[str]:
+        replacement = self._replace(chr(codepoint))
+        if len(self) < _MAX_UNIDECODE_TABLE:
+            self[codepoint] = replacement
+        return replacement
+
+
+class _ReplacedTable(_UnidecodeTable):
+    """A table (for `str.translate`) that deletes characters replaced by unidecode and keeps others,
+    to count replaced characters as a difference of lengths."""
+    def _replace(self, character: str) -> Optional[str]:
+        return None if _UNIDECODE_TABLE[ord(character)] != character else character
+
+
+class _MarkedTable(_UnidecodeTable):
+    """A table (for `str.translate`) of code points to their replacement by unidecode, followed by
+    `_CHANGED_MARK` for replaced characters, to count them in the pass that removes diacritics."""
+    def _replace(self, character: str) -> Optional[str]:
+        replacement = _UNIDECODE_TABLE[ord(character)]
+        return replacement if replacement == character else replacement + _CHANGED_MARK
+
+
+_UNIDECODE_TABLE = _UnidecodeTable()
+_REPLACED_TABLE = _ReplacedTable()
+_MARKED_TABLE = _MarkedTable()
+
 
 class ToCompose:
-    """
+    """Apply a chain of transforms to the reference and the prediction.
 
+    A text given as an iterable of lines (eg. a generator or a file handle) is transformed lazily :
+    :ivar reference: and :ivar prediction: are then iterators of transformed lines,
+    so a huge corpus is preprocessed (eg. before :func: `score_corpus`) without being loaded in memory.
+
+    :Example:
+
+    >>> with open("gt.txt") as reference, open("pred.txt") as prediction:
+    ...     composed = ToCompose([reference, prediction], [ToLowerCase(), RemovePunctuation()])
+    ...     lines_pairs = zip(composed.reference, composed.prediction)
     """
     def __init__(self, sentences: list,
                  type_transforms: Optional[List[Union[
@@ -63,38 +172,161 @@ class ToCompose:
                      TSubRegex,
                      TToLowerCase,
                      TToUpperCase]]]):
-        process = _Composer(type_transforms)(sentences)
+        composer = _Composer(type_transforms)
+        if all(isinstance(text, str) for text in sentences):
+            process = composer(sentences)
+        else:
+            process = [composer(text) for text in sentences]
         self.reference = process[0]
         self.prediction = process[1]
 
 
 class _AbstractTransform(object):
-    def __call__(self, sentences: Union[str, List[str]]):
+    # Character-level transforms map each character independently of its context, so
+    # `_Composer` fuses consecutive ones in a single translation table (see `_map_chars`)
+    _char_level = False
+
+    def __call__(self, sentences: Union[str, List[str], Iterable[str]]):
         if isinstance(sentences, str):
             return self.process_string(sentences)
         elif isinstance(sentences, list):
             return self.process_list(sentences)
+        elif isinstance(sentences, Iterable):
+            return self.process_iter(sentences)
         else:
             raise ValueError(
-                f"input {sentences} was expected to be a string or list of strings"
+                f"input {sentences} was expected to be a string, a list or an iterable of strings"
             )
 
     def process_string(self, sequence: str):
         raise NotImplementedError()
 
-    def process_list(self, group: List[str]):
+    def process_list(self, group: List[str], workers: int = 1, chunk_size: int = 2048):
+        """Transform a list of strings, by chunks of `chunk_size` lines over a pool of `workers` processes
+        for large lists (the transform is sent once to each worker), order of the list is preserved."""
+        processed = _process_parallel(self, group, workers, chunk_size)
+        if processed is not None:
+            return processed
         return [self.process_string(sequence) for sequence in group]
 
+    def process_iter(self, lines: Iterable[str]) -> Iterator[str]:
+        """Transform lines lazily (eg. from a generator or a file handle), one line at a time.
+        Line endings are kept apart from the transform, so transformed lines can be written back as is."""
+        for line in lines:
+            content, ending = _split_line_ending(line)
+            yield self.process_string(content) + ending
+
+    def _map_chars(self, sequence: str):
+        """Character-level part of the transform (the whole transform by default)."""
+        return self.process_string(sequence)
+
+    def _post_process(self, sequence: str):
+        """Part of a character-level transform that depends on context, applied after `_map_chars`."""
+        return sequence
+
+
+class _TranslationTable(dict):
+    """A table for `str.translate` built lazily : each character is mapped once (when it is
+    first met) through a chain of character-level transforms, then looked up. Beyond
+    `_MAX_UNIDECODE_TABLE` code points, characters are mapped but no longer kept.
+
+    Lowercase is not character-level for a capital sigma (final form depends on the next
+    character), characters mapped to it before a lowercase are kept in `context_sensitive`.
+    """
+    def __init__(self, transforms: List[_AbstractTransform]):
+        super().__init__()
+        self.transforms = transforms
+        self.context_sensitive = set()
+
+    def __missing__(self, codepoint: int) -> str:
+        character = chr(codepoint)
+        mapped = character
+        for transform in self.transforms:
+            if isinstance(transform, ToLowerCase) and _CAPITAL_SIGMA in mapped:
+                self.context_sensitive.add(character)
+            mapped = transform._map_chars(mapped)
+        if len(self) < _MAX_UNIDECODE_TABLE:
+            self[codepoint] = mapped
+        return mapped
+
+
+class _FusedTransform(_AbstractTransform):
+    """Consecutive character-level transforms run in a single pass over text."""
+    def __init__(self, transforms: List[_AbstractTransform]):
+        self.transforms = transforms
+        self._table = _TranslationTable(transforms)
+
+    def process_string(self, sequence: str):
+        result = sequence.translate(self._table)
+        if self._table.context_sensitive and any(character in sequence
+                                                 for character in self._table.context_sensitive):
+            # exact result for texts with a capital sigma before lowercase
+            for transform in self.transforms:
+                sequence = transform.process_string(sequence)
+            return sequence
+        # only the last transform of a fused chain may depend on context (see `_Composer._compile`)
+        return self.transforms[-1]._post_process(result)
+
 
 class _Composer(object):
+    """Apply a chain of transforms. Consecutive character-level transforms (eg. case folding,
+    punctuation, digits or diacritics removal) are compiled in a single translation table,
+    so they run in one pass over text instead of one pass (and one copy) per transform.
+    """
     def __init__(self, transforms: List[_AbstractTransform]):
         self.transforms = transforms
+        self._stages = self._compile(transforms)
+
+    @staticmethod
+    def _compile(transforms: List[_AbstractTransform]) -> List[_AbstractTransform]:
+        """Group consecutive character-level transforms, a chain ends with a transform that has a
+        context dependent part (eg. runs of "-" removed by `RemoveDiacritics`)."""
+        stages, chain = [], []
+        for transform in transforms:
+            if transform._char_level:
+                chain.append(transform)
+                if type(transform)._post_process is not _AbstractTransform._post_process:
+                    stages.append(_FusedTransform(chain))
+                    chain = []
+            else:
+                if chain:
+                    stages.append(_FusedTransform(chain))
+                    chain = []
+                stages.append(transform)
+        if chain:
+            stages.append(_FusedTransform(chain))
+        return stages
 
     def __call__(self, text):
-        for transform in self.transforms:
-                text = transform(text)
+        if not isinstance(text, (str, list)):
+            return self.process_iter(text)
+        for stage in self._stages:
+                text = stage(text)
         return text
 
+    def process_string(self, sequence: str) -> str:
+        """Apply all transforms to a string."""
+        for stage in self._stages:
+            sequence = stage.process_string(sequence)
+        return sequence
+
+    def process_list(self, group: List[str], workers: int = 1, chunk_size: int = 2048) -> List[str]:
+        """Apply all transforms to a list of strings, see :meth: `_AbstractTransform.process_list`
+        (all transforms of the chain are applied to a chunk in the same worker)."""
+        processed = _process_parallel(self, group, workers, chunk_size)
+        if processed is not None:
+            return processed
+        return [self.process_string(sequence) for sequence in group]
+
+    def process_iter(self, lines: Iterable[str]) -> Iterator[str]:
+        """Apply all transforms lazily to lines, see :meth: `_AbstractTransform.process_iter`."""
+        stages = self._stages
+        for line in lines:
+            content, ending = _split_line_ending(line)
+            for stage in stages:
+                content = stage.process_string(content)
+            yield content + ending
+
 
 #
 # Tokenizers
@@ -102,15 +334,41 @@ class _Composer(object):
 
 
 class _SentencesToTokens(_AbstractTransform):
-    """
+    """Split a text into tokens on a delimiter, or into words and punctuation signs
+    with `split_punctuation` (the delimiter is then ignored).
 
+    Parameters
+    ----------
+    :param delimiter: string between tokens. Defaults to " ".
+    :type delimiter: str
+    :param split_punctuation: `True` to split words on whitespace and punctuation signs (each one is a token).
+    Defaults to False.
+    :type split_punctuation: bool
+
+    Attributes
+    ----------
+    See Parameters
     """
-    def __init__(self, delimiter: str = " "):
+    def __init__(self, delimiter: str = " ", split_punctuation: bool = False):
         self.delimiter = delimiter
+        self.split_punctuation = split_punctuation
+        self._tokenizer = _Tokenizer(split_punctuation=True) if split_punctuation else None
 
     def process_string(self, sequence: str):
+        if self._tokenizer is not None:
+            return self._tokenizer.tokens(sequence)
         return sequence.split(self.delimiter)
 
+    def process_iter(self, lines: Iterable[str]) -> Iterator[List[str]]:
+        """Tokenize lines lazily, tokens of a line do not include its line ending."""
+        for line in lines:
+            yield self.process_string(_split_line_ending(line)[0])
+
+    def spans(self, sequence: str) -> Tuple[array, array]:
+        """Return start and end offsets of tokens in text (see :class: `_Tokenizer`), tokens are
+        split on whitespace unless punctuation is split."""
+        return (self._tokenizer or _Tokenizer()).spans(sequence)
+
 
 #
 # Transformations
@@ -132,19 +390,20 @@ class RemovePunctuation(_AbstractTransform):
     ----------
     See Parameters
     """
+    _char_level = True
+
     def __init__(self, keep_punctuation: Optional[List[str]] = ''):
         self.keep_punctuation = keep_punctuation
-
-    def process_string(self, sequence: str):
         default_punctuation = string.punctuation
         if len(self.keep_punctuation) == 0:
-            table = str.maketrans('', '', default_punctuation)
+            self._table = str.maketrans('', '', default_punctuation)
         else:
             new_punctuation = "".join(
                 [symbol for symbol in default_punctuation if symbol not in self.keep_punctuation])
-            table = str.maketrans('', '', new_punctuation)
+            self._table = str.maketrans('', '', new_punctuation)
 
-        sequence = sequence.translate(table)
+    def process_string(self, sequence: str):
+        sequence = sequence.translate(self._table)
 
         return sequence
 
@@ -154,25 +413,48 @@ class RemoveDiacritics(_AbstractTransform):
 
     User can directly access to this class or via :class: `ToCompose` class.
     """
-    def process_string(self, sequence: str):
+    _char_level = True
 
-        sequence = unidecode.unidecode(sequence)
-        sequence = re.sub(r'<{2,}', "", sequence)
-        sequence = re.sub(r'>{2,}', "", sequence)
-        sequence = re.sub(r'-{2,}', "", sequence)
+    def process_string(self, sequence: str):
+        sequence = self._post_process(self._map_chars(sequence))
         #sequence = unicodedata.normalize('NFD', sequence)\
            #.encode('ascii', 'ignore')\
            #.decode("utf-8")
         return str(sequence)
 
+    def process_and_count(self, sequence: str) -> Tuple[str, int]:
+        """Remove diacritics and count characters changed (see :func: `count_diacritics`)
+        in the same translation pass."""
+        if sequence.isascii():
+            return self.process_string(sequence), 0
+        if _CHANGED_MARK in sequence:
+            return self.process_string(sequence), count_diacritics(sequence)
+        marked = sequence.translate(_MARKED_TABLE)
+        changed = marked.count(_CHANGED_MARK)
+        return self._post_process(marked.replace(_CHANGED_MARK, "")), changed
+
+    def _map_chars(self, sequence: str):
+        if sequence.isascii():
+            return sequence
+        return sequence.translate(_UNIDECODE_TABLE)
+
+    def _post_process(self, sequence: str):
+        # runs of symbols are removed one after another (removing a run can join another)
+        for symbol, pattern in _RUNS_PATTERNS:
+            if symbol in sequence:
+                sequence = pattern.sub("", sequence)
+        return sequence
+
 
 class RemoveDigits(_AbstractTransform):
     """Remove digits from text.
 
     User can directly access to this class or via :class: `ToCompose` class.
     """
+    _char_level = True
+
     def process_string(self, sequence: str):
-        sequence = re.sub(r"\d+", "", sequence)
+        sequence = _DIGITS_PATTERN.sub("", sequence)
         return sequence
 
 
@@ -186,29 +468,119 @@ class RemoveNonUsefulWords(_AbstractTransform):
         return sequence
 
 
+class _PhraseAutomaton:
+    """An Aho-Corasick automaton over tokens : finds all occurrences of several phrases
+    (sequences of tokens) in one pass over a sequence of tokens, whatever the number of phrases.
+
+    :Example:
+
+    >>> _PhraseAutomaton([("la", "Curée"), ("Curée",)]).find(["La", "la", "Curée", ","])
+    [(1, 3), (2, 3)]
+    """
+    def __init__(self, phrases: List[Tuple[str, ...]]):
+        # transitions, failure links and lengths of phrases ending at each state
+        self._goto = [dict()]
+        self._fail = [0]
+        self._ends = [[]]
+        for phrase in phrases:
+            state = 0
+            for token in phrase:
+                if token not in self._goto[state]:
+                    self._goto.append(dict())
+                    self._fail.append(0)
+                    self._ends.append([])
+                    self._goto[state][token] = len(self._goto) - 1
+                state = self._goto[state][token]
+            self._ends[state].append(len(phrase))
+
+        # failure links by breadth-first traversal (states of first tokens fail to the root),
+        # a state also ends phrases of its failure state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                self._ends[child] = self._ends[child] + self._ends[self._fail[child]]
+
+    def find(self, tokens: List[str]) -> List[Tuple[int, int]]:
+        """Return (start, end) spans of tokens of all phrases found."""
+        spans = []
+        state = 0
+        goto, fail, ends = self._goto, self._fail, self._ends
+        for index, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for length in ends[state]:
+                spans.append((index + 1 - length, index + 1))
+        return spans
+
+
 class RemoveSpecificWords(_AbstractTransform):
     """Remove specifics words that predefined by user.
 
+    Words are looked up in a set and expressions of several words (eg. "et cetera") are found
+    with a token automaton, so removal is linear in the number of tokens whatever the size of the list.
+    With `split_punctuation`, punctuation signs are split from words (eg. "Curée," is "Curée" and ","),
+    so words followed by a punctuation sign are removed too and punctuation is kept in place.
+
     User can directly access to this class or via :class: `ToCompose` class.
 
     Parameters
     ----------
-    :param words_to_remove: list of words to remove.
+    :param words_to_remove: list of words (or expressions of several words) to remove.
     :type words_to_remove: list
+    :param split_punctuation: `True` to split punctuation signs from words. Defaults to False.
+    :type split_punctuation: bool
 
     Attributes
     ----------
     See Parameters
 
     """
-    def __init__(self, words_to_remove: List[str]):
+    def __init__(self, words_to_remove: List[str], split_punctuation: bool = False):
         self.words_to_remove = words_to_remove
+        self.split_punctuation = split_punctuation
+        self._tokenizer = _Tokenizer(split_punctuation)
+        phrases = [tuple(self._tokenizer.tokens(words)) for words in words_to_remove]
+        self._words = frozenset(phrase[0] for phrase in phrases if len(phrase) == 1)
+        phrases = [phrase for phrase in phrases if len(phrase) > 1]
+        self._phrases = _PhraseAutomaton(phrases) if phrases else None
 
     def process_string(self, sequence: str):
-        # TODO(@Luca) : look better tokenization eg. "Curée," to ["Curée", ","]
-        sequence = " ".join([token for token in sequence.split() if token not in self.words_to_remove])
+        if self.split_punctuation:
+            return self._remove_from_spans(sequence)
+        tokens = sequence.split()
+        if self._phrases is not None:
+            removed = bytearray(len(tokens))
+            for start, end in self._phrases.find(tokens):
+                removed[start:end] = b"\x01" * (end - start)
+            tokens = [token for token, is_removed in zip(tokens, removed) if not is_removed]
+        sequence = " ".join([token for token in tokens if token not in self._words])
         return sequence
 
+    def _remove_from_spans(self, sequence: str) -> str:
+        """Remove words located by their spans, a kept token is preceded by a space
+        only if it was preceded by whitespace in text (eg. not a punctuation sign stuck to a word)."""
+        starts, ends = self._tokenizer.spans(sequence)
+        tokens = [sequence[start:end] for start, end in zip(starts, ends)]
+        removed = bytearray(token in self._words for token in tokens)
+        if self._phrases is not None:
+            for start, end in self._phrases.find(tokens):
+                removed[start:end] = b"\x01" * (end - start)
+        pieces = []
+        for index, token in enumerate(tokens):
+            if removed[index]:
+                continue
+            if pieces and sequence[starts[index] - 1].isspace():
+                pieces.append(" ")
+            pieces.append(token)
+        return "".join(pieces)
+
 
 class Strip(_AbstractTransform):
     """Performs text strip.
@@ -219,9 +591,34 @@ class Strip(_AbstractTransform):
         return sequence.strip()
 
 
+def _trie_pattern(rules: List[Tuple[str, bool, int]]) -> str:
+    """Build a regex pattern from a trie of literals (with an optional word boundary after each),
+    a position is then matched in time proportional to the length of literals, not to their number.
+    Longest literals are tried first, an empty group `_rule<index>` marks the end of each literal."""
+    children, ends = dict(), []
+    for literal, boundary, index in rules:
+        if literal:
+            children.setdefault(literal[0], []).append((literal[1:], boundary, index))
+        else:
+            ends.append((index, boundary))
+    alternatives = [re.escape(character) + _trie_pattern(children[character]) for character in sorted(children)]
+    alternatives.extend(("\\b" if boundary else "") + f"(?P<_rule{index}>)" for index, boundary in sorted(ends))
+    return alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+
+
 class SubRegex(_AbstractTransform):
     """Performs substitutions in text with regex patterns.
 
+    Patterns are compiled once and substitutions are chained in the order of the dictionary
+    (each one applies to the result of the previous ones). With `merge`, all patterns are
+    merged in one pattern and text is scanned once, a dispatch table gives the replacement of
+    each match : at each position, the first pattern of the dictionary that matches is replaced,
+    as in chained substitutions. Consecutive literal patterns (optionally between word boundaries,
+    eg. "\\bvn\\b") are merged in a trie, so normalisation tables with hundreds of rules run in time
+    proportional to text. Replaced text is then not substituted again by other rules, and a pattern
+    matching before the match of an earlier one (eg. "ab" after "b" in "ab") is replaced first,
+    so results differ from chained substitutions when rules overlap in this way.
+
     User can directly access to this class or via :class: `ToCompose` class.
 
     Parameters
@@ -229,16 +626,62 @@ class SubRegex(_AbstractTransform):
     :param substitutions: a dictionary where the key is a regex pattern
     and value is the element to substitute.
     :type substitutions: dict
+    :param merge: `True` to apply all patterns in one scan of text. Defaults to False.
+    :type merge: bool
 
     Attributes
     ----------
     See Parameters
     """
-    def __init__(self, substitutions: dict):
+    def __init__(self, substitutions: dict, merge: bool = False):
         self.substitutions = substitutions
+        self.merge = merge
+        self._patterns = [(re.compile(key), value) for key, value in substitutions.items()]
+        self._merged = None
+        # numbered backreferences in patterns would refer to other groups once patterns are merged
+        if merge and self._patterns and not any(_BACKREFERENCE_PATTERN.search(key) for key in substitutions):
+            try:
+                self._merged = re.compile(self._merge_patterns(list(substitutions)))
+            except re.error:
+                # eg. global inline flags of a pattern, substitutions are then chained
+                self._merged = None
+
+    @staticmethod
+    def _merge_patterns(keys: List[str]) -> str:
+        """Merge patterns in one alternation in the order of the dictionary, each pattern identified
+        by a group `_rule<index>`. Consecutive literals (with the same word boundary before them)
+        are merged in a trie, where the longest one matches first : a literal that extends an earlier
+        literal of the trie starts a new trie, so the earlier one still has priority."""
+        alternatives = []
+        rules, boundary = [], False
+        for index, key in enumerate(keys):
+            literal = _LITERAL_RULE_PATTERN.fullmatch(key)
+            if rules and (literal is None or bool(literal.group(1)) != boundary
+                          or any(literal.group(2).startswith(previous) for previous, _, _ in rules)):
+                alternatives.append(("\\b" if boundary else "") + _trie_pattern(rules))
+                rules = []
+            if literal:
+                rules.append((literal.group(2), bool(literal.group(3)), index))
+                boundary = bool(literal.group(1))
+            else:
+                alternatives.append(f"(?P<_rule{index}>{key})")
+        if rules:
+            alternatives.append(("\\b" if boundary else "") + _trie_pattern(rules))
+        return "|".join(alternatives)
+
+    def _dispatch(self, match):
+        """Replacement of a match of the merged pattern, by the rule of the group matched."""
+        pattern, value = self._patterns[int(match.lastgroup[5:])]
+        if "\\" not in value:
+            return value
+        # the rule matches again alone at the same position to expand its own groups (eg. \1)
+        return pattern.match(match.string, match.start()).expand(value)
 
     def process_string(self, sequence: str):
-        sequence = " ".join([re.sub(key, value, sequence) for key, value in self.substitutions.items()])
+        if self._merged is not None:
+            return self._merged.sub(self._dispatch, sequence)
+        for pattern, value in self._patterns:
+            sequence = pattern.sub(value, sequence)
         return sequence
 
 
@@ -247,6 +690,8 @@ class ToLowerCase(_AbstractTransform):
 
     User can directly access to this class or via :class: `ToCompose` class.
     """
+    _char_level = True
+
     def process_string(self, sequence: str):
         return sequence.lower()
 
@@ -256,6 +701,8 @@ class ToUpperCase(_AbstractTransform):
 
     User can directly access to this class or via :class: `ToCompose` class.
     """
+    _char_level = True
+
     def process_string(self, sequence: str):
         return sequence.upper()
 
@@ -263,14 +710,7 @@ class ToUpperCase(_AbstractTransform):
 # Utils functions relative to transformation
 
 def count_diacritics(string):
-    """A simple diacritics counter"""
-    total_diacritics = []
-    for char in string:
-        char_transform = unidecode.unidecode(char)
-        #char_transform = unicodedata.normalize('NFD', char)\
-           #.encode('ascii', 'ignore')\
-           #.decode("utf-8")
-        if char != char_transform:
-            total_diacritics.append(char)
-
-    return len(total_diacritics)
+    """A simple diacritics counter (characters changed by diacritics removal)"""
+    if string.isascii():
+        return 0
+    return len(string) - len(string.translate(_REPLACED_TABLE))
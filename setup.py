@@ -2,8 +2,10 @@
 
 from os import path
 import io
+import sys
 import setuptools
 import subprocess
+from setuptools.command.build_ext import build_ext
 
 here = path.abspath(path.dirname(__file__))
 
@@ -36,7 +38,34 @@ CLASSIFIERS = [
     ]
 
 
+# C shared library of metrics, loaded with ctypes by kami/metrics/legacy/_shared_lib.py.
+# It is not part of `ext_modules`, so wheels stay pure Python (py3-none-any) and the library
+# is built in place on demand with `python setup.py build_metrics_lib`
+METRICS_LIBRARY = setuptools.Extension(
+    "kami.metrics.legacy.metrics_lib",
+    sources=["kami/metrics/legacy/metrics_lib.c"],
+    depends=["kami/metrics/legacy/metrics_lib.h"],
+    export_symbols=["WordErrorRate", "CharacterErrorRate", "WordErrorRateHuntStyle", "WordAccuracy",
+                    "CharacterInformationPreserve", "CharacterInformationLost", "MatchErrorRate",
+                    "ComputeMetricsBatch"],
+    libraries=[] if sys.platform == "win32" else ["m"],
+    optional=True
+)
+
+
+class BuildSharedLibrary(build_ext):
+    """Build C sources of `METRICS_LIBRARY` in place as a plain shared library for ctypes (not a Python
+    module) : no `PyInit_` symbol is exported and the file is named `metrics_lib.so` whatever the platform."""
+    def finalize_options(self):
+        self.distribution.ext_modules = [METRICS_LIBRARY]
+        self.inplace = 1
+        super().finalize_options()
+
+    def get_export_symbols(self, ext):
+        return ext.export_symbols
 
+    def get_ext_filename(self, ext_name):
+        return path.join(*ext_name.split(".")) + ".so"
 
 
 setuptools.setup(
@@ -60,6 +89,7 @@ setuptools.setup(
     #    "kami": ["metrics/*.so"]
     #},
     include_package_data=True,
+    cmdclass={"build_metrics_lib": BuildSharedLibrary},
     python_requires='>=3.8',
     classifiers=CLASSIFIERS,
     keywords=["HTR", "OCR", "Evaluation framework", "metrics", "handwritten text recognition", "optical character recognition"]
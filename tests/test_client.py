@@ -1,6 +1,12 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
 
 from kami.Kami import Kami
+from kami.metrics.evaluation import score_corpus
+from kami.parser import parser_text
+from kami.preprocessing.transformation import RemoveDiacritics, RemoveDigits, ToLowerCase, _Composer, count_diacritics
 
 
 class testKamiClient(unittest.TestCase):
@@ -14,6 +20,74 @@ class testKamiClient(unittest.TestCase):
         self.image_page = "../datatest/lectaurep_set/image_gt_page1/FRAN_0187_16402_L-0.png"
         self.model_page = "../datatest/lectaurep_set/models/mixte_mrs_15.mlmodel"
 
+    def test_streaming_text_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            gt, pred = os.path.join(directory, "gt.txt"), os.path.join(directory, "pred.txt")
+            with open(gt, "w", encoding="utf8") as fh:
+                fh.write(f"{self.reference}\n\n{self.reference}\n")
+            with open(pred, "w", encoding="utf8") as fh:
+                fh.write(f"{self.prediction}\n{self.reference}\nUne ligne en trop\n")
+            k = Kami([gt, pred], streaming=True, workers=1)
+            # short sources are scored without a pool of processes, whatever the number of workers
+            with mock.patch("kami.metrics.evaluation.Pool") as pool:
+                self.assertEqual(Kami([gt, pred], streaming=True).scores.board, k.scores.board)
+            pool.assert_not_called()
+        _, corpus = score_corpus([(self.reference, self.prediction),
+                                  (self.reference, self.reference),
+                                  ("", "Une ligne en trop")])
+        self.assertEqual(k.scores.board, corpus)
+        self.assertEqual(k.scores.board['levensthein_distance_char'], 37)
+
+    def test_text_parser(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "gt.txt")
+            with open(path, "w", encoding="utf8", newline="") as fh:
+                fh.write(f"{self.reference}\r\n\r\n \u00a0\n{self.prediction}")
+            parser = parser_text._TextParser(path)
+            self.assertEqual(len(parser), 2)
+            self.assertEqual(list(parser.lines()), [self.reference, self.prediction])
+            self.assertEqual(parser.text, f"{self.reference}\n{self.prediction}\n")
+            self.assertEqual(list(parser_text._TextParser(path, lazy=True).lines()), [self.reference, self.prediction])
+            # a lone "\r" is a line break, as in files read in text mode
+            with open(path, "w", encoding="utf8", newline="") as fh:
+                fh.write("ab\rcd\n\r\n")
+            self.assertEqual(parser_text._TextParser(path).text, "ab\ncd\n")
+            self.assertEqual(list(parser_text._TextParser(path, lazy=True).lines()), ["ab", "cd"])
+
+    def test_transform_variants(self):
+        k = Kami([self.reference, self.prediction], apply_transforms="DLX")
+        board = k.scores.board
+        # texts without digits are not aligned again
+        self.assertEqual(board["non_digits"], board["default"])
+        lowercase = Kami([self.reference.lower(), self.prediction.lower()]).scores.board
+        self.assertEqual(board["lowercase"], lowercase)
+        self.assertEqual(list(board)[:5], ["default", "non_digits", "lowercase", "remove_diacritics", "all_transforms"])
+        self.assertEqual(board["remove_diacritics"], Kami([RemoveDiacritics()(self.reference),
+                                                          RemoveDiacritics()(self.prediction)]).scores.board)
+        self.assertEqual(board["Total_diacritics_removed_from_reference"], count_diacritics(self.reference))
+
+    def test_severity_matrix(self):
+        k = Kami([self.reference, self.prediction], severity_matrix=True)
+        self.assertEqual(len(k.severity_scores), 32)
+        self.assertEqual(k.severity_scores["default"], k.scores.board)
+        texts = _Composer([RemoveDigits(), ToLowerCase(), RemoveDiacritics()])([self.reference, self.prediction])
+        self.assertEqual(k.severity_scores["DLX"], Kami(texts).scores.board)
+        k = Kami([self.reference, self.prediction], apply_transforms="UP", severity_matrix=True)
+        self.assertEqual(list(k.severity_scores), ["default", "U", "P", "UP"])
+        self.assertEqual(k.severity_scores["UP"], k.scores.board["all_transforms"])
+        # variants are scored with the costs of the default board
+        k = Kami([self.reference, self.prediction], substitution_cost=3, severity_matrix=True)
+        self.assertEqual(k.severity_scores["default"], k.scores.board)
+        self.assertEqual(k.severity_scores["L"], Kami([self.reference.lower(), self.prediction.lower()],
+                                                      substitution_cost=3).scores.board)
+
+    def test_pair_lines(self):
+        reference = "le chat dort\nsur la table\nde la cuisine"
+        prediction = "le chat dort sur la table\nde la cuisime"
+        k = Kami([reference, prediction], pair_lines=True, apply_transforms="U")
+        self.assertEqual(k.scores.board["default"]["levensthein_distance_char"], 1)
+        self.assertEqual(k.scores.board["all_transforms"]["levensthein_distance_char"], 1)
+
     """
     def test_sentences(self):
         k1 = Kami([self.reference, self.prediction], verbosity=False, truncate=True, percent=True, round_digits='0.01')
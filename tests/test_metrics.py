@@ -1,6 +1,24 @@
 import unittest
+import os
+import tempfile
+from collections import Counter
+from operator import itemgetter
+from unittest import mock
 
-from kami.metrics.evaluation import Scorer
+import numpy as np
+
+from Levenshtein import apply_edit, distance, editops
+
+from kami.metrics.evaluation import Scorer, _score_corpus, _score_pair, score_corpus
+from kami.metrics._alignment import (_linear_editops,
+                                    _weighted_editops)
+from kami.metrics.cache import AlignmentCache
+from kami.metrics.collector import ScoreCollector, _numpy_metrics
+from kami.metrics.legacy._shared_lib import METRICS_BATCH, batch_metrics
+from kami.metrics.bootstrap import bootstrap_scores, paired_bootstrap
+from kami.metrics.pairing import match_lines, pair_lines
+from kami.metrics._base_metrics import _WordVocabulary
+from kami.kamutils._tokenizer import _Tokenizer
 
 class testMetrics(unittest.TestCase):
     def setUp(self) -> None:
@@ -70,4 +88,245 @@ class testMetrics(unittest.TestCase):
         with self.assertRaises(TypeError):
             Scorer()
 
+    def test_corpus_is_micro_averaged(self):
+        pairs = [(self.reference, self.prediction), (self.reference, self.reference)]
+        boards, corpus = score_corpus(pairs)
+        self.assertEqual(boards, [Scorer(*pair).board for pair in pairs])
+        self.assertEqual(corpus['levensthein_distance_char'], 20)
+        self.assertEqual(corpus['Length_reference'], 2 * len(self.reference))
+        self.assertAlmostEqual(corpus['cer'], 20 / (2 * len(self.reference)))
+
+    def test_corpus_vocabulary_bounded(self):
+        pairs = [(f"{self.reference} {number}", f"{self.prediction} {number}") for number in range(20)]
+        expected = score_corpus(pairs)
+        vocabulary = _WordVocabulary()
+        with mock.patch("kami.metrics.evaluation._MAX_VOCABULARY_SIZE", 25):
+            self.assertEqual(score_corpus(pairs), expected)
+            for pair in pairs:
+                _score_pair(pair, {}, vocabulary)
+                self.assertLessEqual(len(vocabulary), 25)
+
+    def test_corpus_with_workers(self):
+        pairs = [(self.reference, self.prediction), (self.reference, "")] * 5
+        self.assertEqual(Scorer.batch(pairs, workers=2, chunk_size=3), score_corpus(pairs))
+
+    def test_linear_memory_alignment(self):
+        reference = "\n".join([self.reference] * 20)
+        prediction = "\n".join([self.prediction] * 19)
+        operations = _linear_editops(reference, prediction, max_cells=1000)
+        self.assertEqual(len(operations), distance(reference, prediction))
+        self.assertEqual(apply_edit(operations, reference, prediction), prediction)
+
+    def test_alignment_after_memory_error(self):
+        reference = "\n".join([self.reference] * 4)
+        prediction = "\n".join([self.prediction] * 4)
+        sizes = []
+
+        def _editops(source, destination):
+            sizes.append(len(source) * len(destination))
+            if sizes[-1] > 20000:
+                raise MemoryError
+            return editops(source, destination)
+
+        with mock.patch("kami.metrics._alignment.editops", _editops):
+            operations = _linear_editops(reference, prediction)
+        # a sub-problem that ran out of memory is split, not tried again at the same size
+        self.assertEqual(sizes.count(len(reference) * len(prediction)), 1)
+        self.assertEqual([size for size in sizes if size > 20000 and sizes.count(size) > 1], [])
+        self.assertEqual(apply_edit(operations, reference, prediction), prediction)
+
+    def test_triage_above_threshold(self):
+        scorer = Scorer(self.reference, self.prediction, max_cer=0.05)
+        self.assertTrue(scorer.above_threshold)
+        self.assertIsNone(scorer.cer)
+        self.assertEqual(scorer.board, {'above_threshold': True,
+                                        'max_distance': 5,
+                                        'Length_reference': len(self.reference),
+                                        'Length_prediction': len(self.prediction)})
+
+    def test_triage_weighted_and_decimal_bounds(self):
+        reference = "abcdefghij" * 10
+        prediction = "".join("z" if index % 12 == 0 else char for index, char in enumerate(reference))
+        scorer = Scorer(reference, prediction, substitution_cost=0.5, max_cer=0.05)
+        self.assertFalse(scorer.above_threshold)
+        self.assertAlmostEqual(scorer.cer, 0.045)
+        self.assertTrue(Scorer(reference, prediction, substitution_cost=0.5, max_cer=0.04).above_threshold)
+        boards, _ = score_corpus([(reference, prediction)] * 2, cache=AlignmentCache(), substitution_cost=0.5,
+                                 max_cer=0.05)
+        self.assertFalse(boards[1]["above_threshold"])
+        prediction = "".join("z" if index < 29 else char for index, char in enumerate(reference))
+        self.assertFalse(Scorer(reference, prediction, max_cer=0.29).above_threshold)
+        boards, _ = score_corpus([(reference, prediction)] * 2, cache=AlignmentCache(), max_cer=0.29)
+        self.assertFalse(boards[1]["above_threshold"])
+        boards, _ = score_corpus([(reference, prediction)] * 2, cache=AlignmentCache(), max_cer=0.28)
+        self.assertTrue(boards[1]["above_threshold"])
+
+    def test_triage_below_threshold(self):
+        scorer = Scorer(self.reference, self.prediction, max_distance=20)
+        self.assertFalse(scorer.above_threshold)
+        self.assertEqual(scorer.lev_distance_char, 20)
+        self.assertFalse(scorer.board['above_threshold'])
+        _, corpus = score_corpus([(self.reference, self.prediction), (self.reference, "")], max_distance=20)
+        self.assertEqual(corpus['pairs_above_threshold'], 1)
+        self.assertEqual(corpus['levensthein_distance_char'], 20)
+
+    def test_cache_rescoring(self):
+        pairs = [(self.reference, self.prediction), (self.reference, self.reference), (self.reference, "")]
+        cache = AlignmentCache(maxsize=2)
+        expected = score_corpus(pairs, max_distance=100)
+        self.assertEqual(score_corpus(pairs, cache=cache, max_distance=100), expected)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(score_corpus(pairs[:2], cache=cache, max_distance=100)[0], expected[0][:2])
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+    def test_cache_keys_and_copies(self):
+        self.assertEqual(AlignmentCache.key("a", "b", insertion_cost=1), AlignmentCache.key("a", "b", insertion_cost=1.0))
+        cache = AlignmentCache()
+        pairs = [(self.reference, self.prediction)]
+        expected = score_corpus(pairs, confusions=True)
+        boards, _ = score_corpus(pairs, cache=cache, confusions=True, substitution_cost=1)
+        # board of a pair aligned (not in cache yet)
+        boards[0]["confusions"].clear()
+        boards, corpus = score_corpus(pairs, cache=cache, confusions=True, substitution_cost=1.0)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual((boards, corpus), expected)
+        boards[0]["confusions"].clear()
+        self.assertEqual(score_corpus(pairs, cache=cache, confusions=True), expected)
+
+    def test_weighted_distance_is_optimal(self):
+        # with expensive substitutions, a deletion and an insertion are cheaper
+        scorer = Scorer("chat", "chut", substitution_cost=3.0)
+        self.assertEqual(scorer.lev_distance_char, 2.0)
+        scorer = Scorer("le chat", "le chut", insertion_cost=0.5, substitution_cost=1 / 3)
+        self.assertAlmostEqual(scorer.lev_distance_char, 1 / 3)
+        self.assertAlmostEqual(scorer.lev_distance_words, 1 / 3)
+
+    def test_weighted_counts_from_cheapest_alignment(self):
+        scorer = Scorer("chat", "chut", substitution_cost=3)
+        self.assertEqual((scorer.substs, scorer.deletions, scorer.insertions), (0, 1, 1))
+        self.assertEqual(scorer.substs_weighted + scorer.deletions_weighted + scorer.insertions_weighted,
+                         scorer.lev_distance_char)
+        scorer = Scorer("le chat dort", "le chut dort", substitution_cost=3)
+        self.assertEqual((scorer.word_substs, scorer.word_deletions, scorer.word_insertions), (0, 1, 1))
+        self.assertAlmostEqual(scorer.wer, 2 / 3)
+        self.assertAlmostEqual(scorer.wer_hunt, 1 / 3)
+        reference = "\n".join([self.reference] * 5)
+        prediction = "\n".join([self.prediction] * 5)
+        costs = (0.5, 2, 1.5)
+        operations = Counter(map(itemgetter(0), _weighted_editops(reference, prediction, *costs, max_cells=1000)))
+        self.assertAlmostEqual(operations["insert"] * 0.5 + operations["delete"] * 2 + operations["replace"] * 1.5,
+                               Scorer(reference, prediction, *costs).lev_distance_char)
+
+    def test_large_vocabulary(self):
+        # more words than code points available for a chr()-based encoding
+        vocabulary = _WordVocabulary()
+        vocabulary.encode([f"w{index}" for index in range(70000)])
+        scorer = Scorer("w69998 w69999 w1", "w69999 w1 w2", vocabulary=vocabulary)
+        self.assertEqual(len(vocabulary), 70000)
+        self.assertEqual(scorer.lev_distance_words, 2)
+        self.assertEqual(scorer.word_deletions, 1)
+
+    def test_confusions(self):
+        scorer = Scorer("le chat", "le chot!", confusions=True)
+        self.assertEqual(scorer.confusions, {("a", "o"): 1, ("", "!"): 1})
+        self.assertEqual(scorer.board["confusions"], scorer.confusions)
+        pairs = [("le chat", "le chot!"), ("la chatte", "la chotte")] * 3
+        _, corpus = score_corpus(pairs, workers=2, chunk_size=2, confusions=True, cache=AlignmentCache())
+        self.assertEqual(corpus["confusions"], {("a", "o"): 6, ("", "!"): 3})
+
+    def test_lazy_scorer(self):
+        expected = Scorer("le chat", "le chta").board
+        scorer = Scorer("le chat", "le chta", keep_texts=False)
+        self.assertIsNone(scorer.reference)
+        self.assertEqual(scorer.board, expected)
+        self.assertFalse(hasattr(scorer, "__dict__"))
+        self.assertIsNone(Scorer("le chat", "la souris", max_distance=1).cer)
+        # only the alignment a score comes from is computed
+        scorer = Scorer(self.reference, self.prediction, substitution_cost=2)
+        self.assertEqual(scorer.cer, Scorer(self.reference, self.prediction, substitution_cost=2).board["cer"])
+        self.assertIsNone(scorer._word_counts)
+        self.assertIsNone(scorer._hamming)
+        self.assertIsNotNone(scorer.wer)
+        self.assertIsNotNone(scorer._word_counts)
+
+    def test_collector(self):
+        pairs = [("le chat", "le chta"), ("", "un chien"), ("la souris", "klmnopqrstuvw"), ("abc", "abc")]
+        collector = ScoreCollector(capacity=1)
+        boards, _ = score_corpus(pairs, collector=collector, max_distance=8)
+        columns = collector.columns()
+        self.assertEqual(len(collector), 4)
+        self.assertEqual(list(columns["above_threshold"]), [False, False, True, False])
+        for row in (0, 1, 3):
+            for name in ("wer", "wer_hunt", "cer", "wacc", "cip", "cil", "mer"):
+                self.assertAlmostEqual(columns[name][row], boards[row][name])
+            self.assertEqual(columns["lev_distance_char"][row], boards[row]["levensthein_distance_char"])
+        self.assertEqual(columns["length_char_prediction"][2], 13)
+        with tempfile.TemporaryDirectory() as directory:
+            collector.to_npz(os.path.join(directory, "scores.npz"))
+            collector.to_csv(os.path.join(directory, "scores.csv"))
+            with np.load(os.path.join(directory, "scores.npz")) as archive:
+                self.assertEqual(list(archive["insertions"]), [1, 8, -1, 0])
+            with open(os.path.join(directory, "scores.csv")) as fh:
+                self.assertEqual(len(fh.read().splitlines()), 5)
+
+    @unittest.skipIf(METRICS_BATCH is None, "C shared library of metrics is not built")
+    def test_batch_kernel(self):
+        pairs = [("le chat", "le chta"), ("", "un chien"), ("la souris", "klmnopqrstuvw"), ("", ""),
+                 (self.reference, self.prediction)]
+        collector = ScoreCollector()
+        _score_corpus(pairs, collector=collector, max_distance=8, substitution_cost=0.5)
+        columns = collector.columns()
+        expected = _numpy_metrics(columns)
+        for name, values in batch_metrics(columns).items():
+            np.testing.assert_allclose(values, expected[name])
+
+    def test_bootstrap(self):
+        pairs = [("le chat noir", "le chta noir"), ("un chien", "un chien"), ("la souris", "la sourit")] * 20
+        collector_a, collector_b = ScoreCollector(), ScoreCollector()
+        _, corpus = score_corpus(pairs, collector=collector_a)
+        score_corpus([(reference, reference) for reference, _ in pairs], collector=collector_b)
+        intervals = bootstrap_scores(collector_a, resamples=500, seed=0)
+        self.assertAlmostEqual(intervals["cer"]["score"], corpus["cer"])
+        self.assertLessEqual(intervals["cer"]["low"], intervals["cer"]["score"])
+        self.assertGreaterEqual(intervals["cer"]["high"], intervals["cer"]["score"])
+        differences = paired_bootstrap(collector_a, collector_b, resamples=500, seed=0)
+        self.assertAlmostEqual(differences["wer"]["score"], corpus["wer"])
+        self.assertGreater(differences["wer"]["low"], 0)
+        self.assertEqual(differences["wer"]["p_value"], 0.0)
+
+    def test_pair_lines(self):
+        references = ["le chat dort", "sur la table", "de la cuisine", "pendant que", "la souris mange"]
+        predictions = ["le chat dort sur la table", "de la cuisime", "la souris mange", "une ligne en trop"]
+        self.assertEqual(pair_lines(references, predictions), [
+            ("le chat dort sur la table", "le chat dort sur la table"),
+            ("de la cuisine", "de la cuisime"),
+            ("pendant que", ""),
+            ("la souris mange", "la souris mange"),
+            ("", "une ligne en trop")])
+        self.assertEqual(pair_lines([], ["une ligne"]), [("", "une ligne")])
+
+    def test_match_lines(self):
+        references = ["Colonne 1 ligne 1", "Colonne 1 ligne 2", "Colonne 2 ligne 1", "Colonne 2 ligne 2"]
+        predictions = ["Colonne 1 ligne 1", "Colonne 2 ligne 1", "Colonne 1 ligme 2", "Colonne 2 ligne 2", "Ø"]
+        self.assertEqual(match_lines(references, predictions, candidates=2), [
+            ("Colonne 1 ligne 1", "Colonne 1 ligne 1"),
+            ("Colonne 1 ligne 2", "Colonne 1 ligme 2"),
+            ("Colonne 2 ligne 1", "Colonne 2 ligne 1"),
+            ("Colonne 2 ligne 2", "Colonne 2 ligne 2"),
+            ("", "Ø")])
 
+    def test_split_punctuation(self):
+        text = "la Curée,\u00a0dit-il  : ſ\u0304"
+        self.assertEqual(_Tokenizer().tokens(text), text.split())
+        starts, ends = _Tokenizer().spans(text)
+        self.assertEqual([text[start:end] for start, end in zip(starts, ends)], text.split())
+        starts, ends = _Tokenizer(split_punctuation=True).spans(text)
+        self.assertEqual([text[start:end] for start, end in zip(starts, ends)],
+                         ["la", "Curée", ",", "dit", "-", "il", ":", "ſ\u0304"])
+        scorer = Scorer("le chat, dort", "le chat dort", split_punctuation=True)
+        self.assertEqual((scorer.length_words_reference, scorer.word_deletions, scorer.wer), (4, 1, 0.25))
+        cache = AlignmentCache()
+        pairs = [("le chat, dort", "le chat dort")]
+        score_corpus(pairs, cache=cache)
+        _, corpus = score_corpus(pairs, cache=cache, split_punctuation=True)
+        self.assertEqual((cache.hits, corpus["wer"]), (0, 0.25))
@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 from kami.preprocessing.transformation import (ToLowerCase,
                                                ToUpperCase,
@@ -9,7 +10,9 @@ from kami.preprocessing.transformation import (ToLowerCase,
                                                RemoveSpecificWords,
                                                Strip,
                                                SubRegex,
-                                               ToCompose)
+                                               ToCompose,
+                                               _Composer,
+                                               count_diacritics)
 
 
 class testPreprocessing(unittest.TestCase):
@@ -45,6 +48,35 @@ class testPreprocessing(unittest.TestCase):
         transform = RemoveSpecificWords(words_to_remove=words_to_remove)(self.sentence)
         self.assertEqual(transform, "Les 13 ans de ? étaient, terriblement, savants ! - La Curée, 1871. En avant, pour la lecture.")
 
+    def test_removeSpecificPhrases(self):
+        words_to_remove = ["Maxime", "La Curée,", "Curée, 1871.", "En avant, pour la lecture."]
+        transform = RemoveSpecificWords(words_to_remove=words_to_remove)(self.sentence)
+        self.assertEqual(transform, "Les 13 ans de ? étaient, Déjà terriblement, savants ! -")
+        transform = RemoveSpecificWords(words_to_remove=["Maxime", "Curée", "pour la lecture"],
+                                        split_punctuation=True)(self.sentence)
+        self.assertEqual(transform, "Les 13 ans de ? étaient, Déjà terriblement, savants ! - La, 1871. En avant,.")
+
+    def test_streaming(self):
+        def lines():
+            yield "Les 13 ans de Maxime ?\n"
+            yield "La Curée, 1871.\r\n"
+            yield "En avant"
+        transforms = [ToLowerCase(), RemovePunctuation(), RemoveSpecificWords(words_to_remove=["maxime"])]
+        transformed = _Composer(transforms)(lines())
+        self.assertNotIsInstance(transformed, list)
+        self.assertEqual(list(transformed), ["les 13 ans de\n", "la curée 1871\r\n", "en avant"])
+        self.assertEqual(list(Strip()(iter([" a \n", "b"]))), ["a\n", "b"])
+        composed = ToCompose([lines(), "Les 13 ans"], [ToUpperCase()])
+        self.assertEqual(next(composed.reference), "LES 13 ANS DE MAXIME ?\n")
+        self.assertEqual(composed.prediction, "LES 13 ANS")
+
+    def test_parallelProcessList(self):
+        lines = [f"{self.sentence} {number}" for number in range(12000)]
+        transform = _Composer([RemoveDiacritics(), SubRegex({r"(\d+)\.": r"\1"}), ToLowerCase()])
+        expected = [transform.process_string(line) for line in lines]
+        self.assertEqual(transform.process_list(lines, workers=2, chunk_size=1000), expected)
+        self.assertEqual(RemoveDiacritics().process_list(lines, workers=2), RemoveDiacritics()(lines))
+
     def test_strip(self):
         transform = Strip()(self.sentence)
         self.assertEqual(transform, "Les 13 ans de Maxime ? étaient, Déjà terriblement, savants ! - La Curée, 1871. En avant, pour la lecture.")
@@ -54,10 +86,50 @@ class testPreprocessing(unittest.TestCase):
         transform = SubRegex(substitutions=substitutions)(self.sentence)
         self.assertEqual(transform, "-- REPLACE -- 13 ans de Maxime ? étaient, Déjà terrib-- REPLACE --, savants ! - -- REPLACE -- Curée, 1871. En avant, pour -- REPLACE -- -- REPLACE --.")
 
+    def test_subRegexChained(self):
+        substitutions = {"ſ": "s", r"\bvn\b": "un", "vne": "une", r"(\d+)\.": r"\1"}
+        sentence = "vn ſeul ieu, vne fois en 1871."
+        self.assertEqual(SubRegex(substitutions=substitutions)(sentence), "un seul ieu, une fois en 1871")
+        self.assertEqual(SubRegex(substitutions=substitutions, merge=True)(sentence), "un seul ieu, une fois en 1871")
+        # replaced text is substituted again only if substitutions are chained
+        self.assertEqual(SubRegex({"a": "b", "b": "c"})("ab"), "cc")
+        self.assertEqual(SubRegex({"a": "b", "b": "c"}, merge=True)("ab"), "bc")
+        # merged patterns keep the priority of the dictionary between literals, with or without boundaries,
+        # and regex patterns
+        for substitutions, sentence in [({r"\bvn": "X", "vne": "Y"}, "vne"), ({"vne": "Y", r"\bvn": "X"}, "vne"),
+                                        ({"vn": "X", "vne": "Y"}, "vne"), ({".": "_", "a": "b"}, "a.")]:
+            self.assertEqual(SubRegex(substitutions, merge=True)(sentence), SubRegex(substitutions)(sentence))
+
     def test_multipleReplace(self):
         transform = ToCompose([self.sentence, ""], [RemoveDiacritics(), RemovePunctuation(), ToLowerCase(), RemoveNonUsefulWords()])
         self.assertEqual(transform.reference, "les 13 ans de maxime etaient deja terriblement savants la curee 1871 en avant pour la lecture")
 
+    def test_countDiacritics(self):
+        self.assertEqual(count_diacritics(self.sentence), 4)
+        self.assertEqual(count_diacritics("Œuvre, ǅ et Σ"), 3)
+        self.assertEqual(count_diacritics("ascii"), 0)
+        for sequence in [self.sentence, "Œuvre, ǅ et Σ\x00 -- é", "ascii <<<"]:
+            self.assertEqual(RemoveDiacritics().process_and_count(sequence),
+                             (RemoveDiacritics()(sequence), count_diacritics(sequence)))
+
+    def test_fusedCompose(self):
+        transforms = [ToUpperCase(), RemoveDigits(), ToLowerCase(), RemoveDiacritics(), RemovePunctuation()]
+        for sentence in [self.sentence, "ΟΔΥΣΣΕΥΣ ας 12--<<-", "-<<->>>-"]:
+            expected = sentence
+            for transform in transforms:
+                expected = transform(expected)
+            self.assertEqual(_Composer(transforms)(sentence), expected)
+        self.assertEqual(len(_Composer(transforms)._stages), 2)
+
+    def test_fusedTableBounded(self):
+        sentence = "".join(map(chr, range(0x0100, 0x0300)))
+        expected = RemoveDiacritics()(ToLowerCase()(sentence))
+        composer = _Composer([ToLowerCase(), RemoveDiacritics()])
+        with mock.patch("kami.preprocessing.transformation._MAX_UNIDECODE_TABLE", 100):
+            self.assertEqual(composer(sentence), expected)
+            self.assertEqual(composer(sentence), expected)
+        self.assertEqual(len(composer._stages[0]._table), 100)
+
 
 
 